@@ -0,0 +1,13 @@
+from .state import StateStore
+from .watcher import ImportWatcher
+from .metrics import Metrics, getMetrics
+from .repoconfig import RepoConfig, getRepoConfig
+from .shard import Shard, ShardLock
+from .gitmirror import GitMirror, MirrorError
+from .verify import Verifier, Verification, VerifyError
+from .plan import Plan, RequestBudget
+from .journal import Journal
+from .webhook import WebhookReceiver
+from .trace import Tracer, getTracer
+from .repofilter import RepoFilter
+from .scheduler import PriorityExecutor, repoPriority
@@ -0,0 +1,150 @@
+import base64
+import concurrent.futures
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+import urllib.parse
+
+class GitMirror:
+    """Mirror repositories with git itself instead of the GitLab
+    importer.
+
+    A bare mirror of every repository is kept under base, at
+    OWNER/NAME.git.  A sync clones the mirror (git clone --mirror) the
+    first time and fetches into it (git fetch --prune) afterwards, then
+    pushes its branches and tags to GitLab.  The git commands run in a
+    bounded pool of worker processes.
+
+    A mirror is cloned under a temporary name and renamed into place
+    once complete, so a mirror that exists is always whole.  A fork is
+    cloned with the mirror of its upstream as a reference when that
+    mirror exists, so the two share objects through
+    objects/info/alternates.  Objects of a mirror used as a reference
+    are never pruned by git gc, since forks may depend on them.
+
+    Credentials are passed to git in its environment, scoped to the
+    host they belong to, so tokens never appear in command lines or
+    remote URLs.
+    """
+
+    def __init__(self, base, workers=4, credentials=None, git="git", timeout=3600):
+        """Create a new mirror engine.
+
+        Arguments
+
+        base: Directory the bare mirrors are kept in.
+        workers: Number of git processes run at once.
+        credentials: Dictionary of host name to (user, token), used for
+            HTTPS fetches and pushes to that host.
+        git: The git executable.
+        timeout: Seconds after which a git command is killed.
+        """
+        self.base = base
+        self._credentials = credentials or {}
+        self._git = git
+        self._timeout = timeout
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def path(self, full_name):
+        """Return the path of the mirror of the repository full_name."""
+        return os.path.join(self.base, full_name + ".git")
+
+    def sync(self, gh_repo, push_url, source=None):
+        """Update the mirror of gh_repo and push it to push_url.
+
+        Arguments
+
+        gh_repo: The GithubRepo to mirror.
+        push_url: The git URL of the GitLab project to push to.
+        source: Full name of the repository gh_repo was forked from, if
+            any.  Its mirror is used as a reference for the first clone.
+
+        Returns a future resolving to a dictionary with the seconds taken
+        by the "fetch" and "push", and whether the mirror was "cloned".
+        The future raises MirrorError if a git command fails.
+        """
+        reference = None
+        if source is not None and os.path.isdir(self.path(source)):
+            reference = self.path(source)
+        return self._pool.submit(_mirror, self._git, self.path(gh_repo.full_name),
+                                 gh_repo.clone_url, push_url, reference,
+                                 gitEnv(self._credentials, gh_repo.clone_url, push_url),
+                                 self._timeout)
+
+    def close(self):
+        """Wait for the running git commands to finish."""
+        self._pool.shutdown(wait=True)
+
+
+def gitEnv(credentials, *urls):
+    """Return the git configuration that authenticates to the hosts of
+    urls, as GIT_CONFIG_* environment variables.  credentials maps host
+    names to (user, token)."""
+    env = {}
+    for url in urls:
+        parts = urllib.parse.urlsplit(url)
+        credential = credentials.get(parts.hostname)
+        if parts.scheme not in ("http", "https") or credential is None:
+            continue
+        n = len(env) // 2
+        auth = base64.b64encode(":".join(credential).encode()).decode()
+        env[f"GIT_CONFIG_KEY_{n}"] = f"http.{parts.scheme}://{parts.netloc}/.extraHeader"
+        env[f"GIT_CONFIG_VALUE_{n}"] = f"Authorization: Basic {auth}"
+    if env:
+        env["GIT_CONFIG_COUNT"] = str(len(env) // 2)
+    return env
+
+
+class MirrorError(Exception):
+    def __init__(self, command, returncode, stderr):
+        self.command = command
+        self.returncode = returncode
+        self.stderr = stderr
+
+    def __str__(self):
+        return f"git {self.command} failed ({self.returncode}): {self.stderr.strip()}"
+
+    def __reduce__(self):
+        return (MirrorError, (self.command, self.returncode, self.stderr))
+
+
+def _mirror(git, path, url, push_url, reference, env, timeout):
+    """Clone or fetch the mirror at path from url, then push its
+    branches and tags to push_url.  Runs in a worker process."""
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0", **env)
+
+    def run(command, *args):
+        r = subprocess.run([git, *args], env=env, capture_output=True, text=True,
+                           timeout=timeout)
+        if r.returncode != 0:
+            raise MirrorError(command, r.returncode, r.stderr)
+
+    result = {'cloned': not os.path.isdir(path)}
+    start = time.monotonic()
+    if result['cloned']:
+        # Left over by a clone that was killed
+        partial = path + ".partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        args = ["clone", "--mirror", "--quiet"]
+        if reference is not None:
+            # The reference now holds objects of this mirror too
+            run("config", "-C", reference, "config", "gc.pruneExpire", "never")
+            args += ["--reference-if-able", reference]
+        run("clone", *args, url, partial)
+        os.rename(partial, path)
+    else:
+        # Follow renames of the GitHub repository
+        run("remote", "-C", path, "remote", "set-url", "origin", url)
+        run("fetch", "-C", path, "fetch", "--prune", "--quiet", "origin")
+    result['fetch'] = time.monotonic() - start
+    start = time.monotonic()
+    # Only branches and tags: GitHub's pull request refs are not wanted
+    # (and usually refused) on GitLab
+    run("push", "-C", path, "push", "--prune", "--quiet", push_url,
+        "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+    result['push'] = time.monotonic() - start
+    return result
@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+import time
+
+class Journal:
+    """Append-only record of the progress of a sync run, to resume it
+    after a crash.
+
+    Every stage a repository reaches is appended as one JSON line and
+    synced to disk before the run moves on.  A run that completes
+    empties the journal, so a journal found non-empty at startup was
+    left by a run that was interrupted, and interrupted() tells how far
+    each of its repositories got.
+    """
+
+    # Stages recorded for a repository, in the order they are reached
+    IMPORT_SUBMITTED = "import-submitted"
+    IMPORT_FINISHED = "import-finished"
+    MIRROR_CONFIGURED = "mirror-configured"
+    FAILED = "failed"
+
+    def __init__(self, path):
+        """Open (creating if needed) the journal at path."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._interrupted = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line torn by the crash
+                        continue
+                    self._interrupted[record['id']] = record
+        self._file = open(path, "a")
+
+    def interrupted(self):
+        """Return the last record of each repository of the interrupted
+        run, keyed by GitHub id.  Empty if the last run completed."""
+        return self._interrupted
+
+    def record(self, gh_repo, stage, **fields):
+        """Record that gh_repo reached stage, with fields to keep about
+        it, such as the GitLab project id."""
+        record = {'t': time.time(), 'id': gh_repo.id, 'name': gh_repo.full_name,
+                  'stage': stage, **fields}
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def complete(self):
+        """Mark the run as completed by emptying the journal."""
+        with self._lock:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._interrupted = {}
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,198 @@
+import contextlib
+import http.server
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+from . import trace
+
+# Histogram buckets in seconds, from fast API calls up to slow imports
+_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+            300, 600, 1800)
+
+_HELP = {
+    'gh_sync_http_requests_total': ('counter', "HTTP requests made, by endpoint and status"),
+    'gh_sync_http_request_duration_seconds': ('histogram', "HTTP request latency, by endpoint"),
+    'gh_sync_stage_duration_seconds': ('histogram', "Time spent in each sync stage"),
+    'gh_sync_repos_total': ('counter', "Repositories processed, by result"),
+    'gh_sync_run_duration_seconds': ('gauge', "Duration of the last sync run"),
+    'gh_sync_last_run_timestamp_seconds': ('gauge', "Time the last sync run ended"),
+    'gh_sync_verify_total': ('counter', "Mirrors verified against GitHub, by status"),
+    'gh_sync_webhook_events_total': ('counter', "Webhook events handled in daemon mode, by event and result"),
+}
+
+# Path segments that identify a single object: numeric ids and
+# URL encoded "GROUP/PROJECT" paths
+_ID_SEGMENT = re.compile(r"^(\d+|.*%2[Ff].*)$")
+
+
+class Metrics:
+    """Prometheus-compatible metrics for a sync run.
+
+    Metrics is a transport observer, so registering it with
+    Transport.addObserver counts and times every API request per
+    endpoint.  Sync stages are timed with stage().  The metrics are
+    written in the Prometheus text format to a node_exporter textfile,
+    or served on a local /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._histograms = {}
+
+    def inc(self, name, labels=None, value=1):
+        """Add value to a counter."""
+        key = (name, _labelKey(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        """Set a gauge."""
+        with self._lock:
+            self._values[(name, _labelKey(labels))] = value
+
+    def observe(self, name, value, labels=None):
+        """Add an observation to a histogram."""
+        key = (name, _labelKey(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [[0] * len(_BUCKETS), 0.0, 0]
+            for (i, bound) in enumerate(_BUCKETS):
+                if value <= bound:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the enclosed block as the sync stage name, and trace it
+        when tracing is enabled."""
+        start = time.monotonic()
+        try:
+            with trace.getTracer().span(name):
+                yield
+        finally:
+            self.observe('gh_sync_stage_duration_seconds', time.monotonic() - start,
+                         {'stage': name})
+
+    def timeIter(self, name, iterable):
+        """Yield from iterable, timing the total time spent waiting on
+        it as the sync stage name.  Each wait is traced separately."""
+        waited = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.monotonic()
+                wall = time.time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    waited += time.monotonic() - start
+                    trace.getTracer().record(name, wall, time.monotonic() - start)
+                yield item
+        finally:
+            self.observe('gh_sync_stage_duration_seconds', waited, {'stage': name})
+
+    def onRequest(self, method, url, status, start, elapsed):
+        """Transport observer: record one HTTP request."""
+        parts = urllib.parse.urlsplit(url)
+        labels = {'host': parts.netloc, 'method': method, 'endpoint': _endpoint(parts.path)}
+        self.inc('gh_sync_http_requests_total',
+                 dict(labels, status=str(status) if status is not None else "error"))
+        self.observe('gh_sync_http_request_duration_seconds', elapsed, labels)
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted(self._histograms.items())
+        seen = set()
+        for ((name, labels), value) in values:
+            _header(lines, seen, name)
+            lines.append(f"{name}{_labelText(labels)} {_number(value)}")
+        for ((name, labels), (buckets, total, count)) in histograms:
+            _header(lines, seen, name)
+            for (bound, n) in zip(_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{_labelText(labels + (('le', _number(bound)),))} {n}")
+            lines.append(f"{name}_bucket{_labelText(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labelText(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labelText(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def writeTextfile(self, path):
+        """Write the metrics to path for the node_exporter textfile
+        collector, replacing the file atomically."""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve the metrics on http://host:port/metrics from a
+        background thread.  Returns the server; call its shutdown()
+        to stop it."""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+_metrics = Metrics()
+
+def getMetrics():
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+def _endpoint(path):
+    """Return the API endpoint of path, with its object ids folded."""
+    return "/".join(":id" if _ID_SEGMENT.match(seg) else seg for seg in path.split("/"))
+
+
+def _labelKey(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _labelText(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for (k, v) in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _header(lines, seen, name):
+    if name not in seen:
+        seen.add(name)
+        (kind, text) = _HELP.get(name, ('untyped', name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+import urllib.parse
+
+import github
+
+# Most API calls of each action, as (reads, writes, polls), and its
+# priority, lower first.  An import looks up the project, reads the new
+# project and its pull mirror, and writes the import and the mirror.
+# It is polled at most polls times, and left for a later run if it is
+# still running then.  An import to a project renamed by gitLabRepoName
+# looks the project up once more, under the GitHub name.
+ACTIONS = {
+    'import': ((3, 2, 5), 1),
+    'fix-mirror': ((1, 1, 0), 2),
+    'set-mirror': ((1, 1, 0), 2),
+    'check-mirror': ((1, 1, 0), 3),
+    'noop': ((0, 0, 0), None),
+}
+
+class Plan:
+    """The actions a sync would take, with the API calls each is
+    expected to cost.
+
+    A plan is built from the repository listing, the GitLab project
+    index and the state store only, so building it costs a few list
+    requests.  It is saved as JSON, and applied later in priority
+    order within a request budget.
+    """
+
+    def __init__(self, actions=None, created=None, planning_requests=0):
+        self.actions = actions or []
+        self.created = created or time.time()
+        self.planning_requests = planning_requests
+
+    def add(self, gh_repo, gl_project, gl_path, namespace, gitlab_repo, state=None):
+        """Decide the action for gh_repo, to be mirrored to the project
+        gitlab_repo of namespace (gl_path).  gl_project is the project
+        found in the index, with id -1 if there is none."""
+        if gl_project.id == -1:
+            action = 'import'
+        elif state is not None and state.isCurrent(gh_repo, gl_path, gh_repo.clone_url):
+            action = 'noop'
+        elif not gl_project.mirror:
+            action = 'set-mirror'
+        elif gl_project.import_url is None:
+            # The project list does not show the mirror URL to everyone
+            action = 'check-mirror'
+        elif _stripCredentials(gl_project.import_url) != _stripCredentials(gh_repo.clone_url):
+            action = 'fix-mirror'
+        else:
+            action = 'check-mirror'
+        ((reads, writes, polls), priority) = ACTIONS[action]
+        if action == 'import' and gitlab_repo != gh_repo.name:
+            reads += 1
+        self.actions.append({'action': action, 'priority': priority,
+                             'reads': reads, 'writes': writes, 'polls': polls,
+                             'gitlab': gl_path, 'namespace': namespace,
+                             'gitlab_repo': gitlab_repo,
+                             'repo': gh_repo.asDict()})
+
+    def pending(self):
+        """Return the actions that do something, in priority order."""
+        return sorted((a for a in self.actions if a['priority'] is not None),
+                      key=lambda a: a['priority'])
+
+    def totals(self):
+        """Return the number of actions by kind, and the estimated
+        reads, writes and polls of the whole plan."""
+        totals = {'reads': 0, 'writes': 0, 'polls': 0}
+        counts = {action: 0 for action in ACTIONS}
+        for a in self.actions:
+            counts[a['action']] += 1
+            for k in ('reads', 'writes', 'polls'):
+                totals[k] += a[k]
+        return (counts, totals)
+
+    def summary(self):
+        """Return the plan totals as printable lines."""
+        (counts, totals) = self.totals()
+        lines = [f"{count:>7} {action}" for (action, count) in counts.items()]
+        lines.append(f"Estimated API calls: {totals['reads']} reads, {totals['writes']} writes, "
+                     f"{totals['polls']} polls "
+                     f"({sum(totals.values())} total, {self.planning_requests} used to plan)")
+        return lines
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({'created': self.created,
+                       'planning_requests': self.planning_requests,
+                       'actions': self.actions}, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            p = json.load(f)
+        return cls(p['actions'], p['created'], p.get('planning_requests', 0))
+
+    @staticmethod
+    def repo(action):
+        """Return the GithubRepo of a planned action."""
+        return github.github.GithubRepo(**action['repo'])
+
+
+class RequestBudget:
+    """Transport observer counting API requests against a budget.
+
+    Callers reserve the estimated cost of an action before starting it
+    and release the reservation when it is done, so concurrent actions
+    cannot overrun the budget together.
+    """
+
+    def __init__(self, budget=None):
+        """budget is the number of requests allowed, None for no limit."""
+        self.budget = budget
+        self.used = 0
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    def onRequest(self, method, url, status, start, elapsed):
+        with self._lock:
+            self.used += 1
+
+    def reserve(self, cost):
+        """Reserve cost requests.  Returns False if that would exceed
+        the budget."""
+        with self._lock:
+            if self.budget is not None and self.used + self._reserved + cost > self.budget:
+                return False
+            self._reserved += cost
+            return True
+
+    def release(self, cost):
+        with self._lock:
+            self._reserved -= cost
+
+
+def _stripCredentials(url):
+    """Return url without its user information and .git suffix, as
+    GitLab masks the credentials of mirror URLs."""
+    parts = urllib.parse.urlsplit(url)
+    netloc = parts.netloc.rsplit("@", 1)[-1]
+    path = parts.path[:-4] if parts.path.endswith(".git") else parts.path
+    return urllib.parse.urlunsplit((parts.scheme, netloc, path, "", ""))
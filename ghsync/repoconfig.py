@@ -0,0 +1,182 @@
+import configparser
+import fnmatch
+import logging
+import os
+import re
+import threading
+
+# Options of a repository section, and the keys they are returned as
+_OPTIONS = (('gitLabNSpace', 'gitlaborg'), ('gitLabRepoName', 'gitlabRepo'))
+
+# Section names that are not repository overrides
+_RESERVED = ('global',)
+
+# Inline flags at the start of an expression, such as (?i)
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+# Group references by number: backreferences and conditionals.  A
+# false positive only costs a match of its own.
+_GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?\(")
+
+class RepoConfig:
+    """Index of the per-repository overrides in a configuration file.
+
+    The file is parsed once, and parsed again only when its
+    modification time changes.  A section named after a repository
+    overrides the GitLab namespace (gitLabNSpace) and project name
+    (gitLabRepoName) of that repository.  A section name containing
+    glob characters (``[fms-*]``) or starting with ``re:``
+    (``[re:^fms-.*$]``) applies to every repository whose name matches.
+    An exact section wins over patterns, and the first matching pattern
+    in the file wins over later ones.  The patterns are matched with a
+    PatternMatcher, so a lookup is one dictionary lookup and usually
+    one match.  A section whose expression does not compile is logged
+    and ignored.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        # (default namespace, exact overrides, pattern overrides,
+        # PatternMatcher of the patterns), replaced as a whole so a
+        # lookup never mixes two versions of the file
+        self._index = (None, {}, [], None)
+
+    def get(self, repo):
+        """Return the GitLab namespace and project name for repo, as a
+        dictionary with the keys gitlaborg and gitlabRepo."""
+        self._reload()
+        (default, exact, patterns, matcher) = self._index
+        conf = {'gitlaborg': default, 'gitlabRepo': repo}
+        overrides = exact.get(repo)
+        if overrides is None and matcher is not None:
+            n = matcher.match(repo)
+            if n is not None:
+                overrides = patterns[n]
+        if overrides:
+            conf.update(overrides)
+        return conf
+
+    def _reload(self):
+        """Parse the file again if it changed since it was last read."""
+        mtime = os.stat(self._path).st_mtime_ns
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            config = configparser.ConfigParser()
+            config.read(self._path)
+            default = config.get('global', 'gitLabNSpace')
+            exact = {}
+            patterns = []
+            expressions = []
+            for section in config.sections():
+                if section in _RESERVED:
+                    continue
+                overrides = {key: config.get(section, option)
+                             for (option, key) in _OPTIONS
+                             if config.has_option(section, option)}
+                expression = patternExpression(section)
+                if expression is None:
+                    exact[section] = overrides
+                    continue
+                try:
+                    expression = scopedExpression(expression)
+                except re.error as err:
+                    logging.warning(f"Ignoring section [{section}] of {self._path}: {err}")
+                    continue
+                expressions.append(expression)
+                patterns.append(overrides)
+            self._index = (default, exact, patterns,
+                           PatternMatcher(expressions) if expressions else None)
+            self._mtime = mtime
+
+
+def patternExpression(name):
+    """Return the regular expression of the repository name pattern
+    name: the rest of a name starting with "re:", or the translation
+    of a glob.  Returns None for a plain repository name."""
+    if name.startswith('re:'):
+        return name[3:]
+    if any(c in name for c in '*?['):
+        return fnmatch.translate(name)
+    return None
+
+
+def scopedExpression(expression):
+    """Return the regular expression expression ready to be joined with
+    others into one alternation: its leading inline flags, such as
+    (?i), which are only allowed at the start of the whole expression,
+    are turned into a group scoped to expression.  Raises re.error if
+    expression does not compile on its own."""
+    flags = ""
+    m = _GLOBAL_FLAGS.match(expression)
+    while m is not None:
+        flags += m.group(1)
+        expression = expression[m.end():]
+        m = _GLOBAL_FLAGS.match(expression)
+    if flags:
+        # A verbose expression may end with a comment, which would
+        # swallow the closing parenthesis
+        end = "\n" if 'x' in flags else ""
+        expression = f"(?{flags}:{expression}{end})"
+    re.compile(expression)
+    return expression
+
+
+class PatternMatcher:
+    """Find the first of a list of regular expressions that a name fully
+    matches.
+
+    Consecutive expressions are joined into one alternation, each in a
+    named group telling which one matched, so a name is usually checked
+    with a single match.  An expression with named groups or group
+    references is matched on its own: joined, its groups would be
+    renumbered, its references would point at the groups of another
+    expression, and its names could clash with the generated ones.
+    """
+
+    def __init__(self, expressions):
+        """expressions must each compile on their own, see
+        scopedExpression."""
+        # (compiled, index), index None for a joined run
+        self._runs = []
+        run = []
+        for (n, expression) in enumerate(expressions):
+            compiled = re.compile(expression)
+            if compiled.groupindex or _GROUP_REFERENCE.search(expression):
+                self._join(run)
+                run = []
+                self._runs.append((compiled, n))
+            else:
+                run.append((n, expression))
+        self._join(run)
+
+    def _join(self, run):
+        if not run:
+            return
+        try:
+            self._runs.append((re.compile("|".join(f"(?P<p{n}>{e})" for (n, e) in run)), None))
+        except re.error:
+            self._runs.extend((re.compile(e), n) for (n, e) in run)
+
+    def match(self, name):
+        """Return the index of the first expression fully matching
+        name, or None."""
+        for (compiled, n) in self._runs:
+            m = compiled.fullmatch(name)
+            if m is not None:
+                return n if n is not None else int(m.lastgroup[1:])
+        return None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def getRepoConfig(path):
+    """Return the shared RepoConfig for the configuration file path."""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = RepoConfig(path)
+        return index
@@ -0,0 +1,103 @@
+import collections
+import datetime
+import re
+import threading
+
+from .repoconfig import PatternMatcher, patternExpression, scopedExpression
+
+class RepoFilter:
+    """Name and size rules choosing which repositories of the
+    organization to sync.
+
+    A repository is synced if its name matches one of the include
+    patterns (or there are none), matches none of the exclude patterns,
+    and is not too large.  Patterns are repository names, globs
+    (``fms-*``) or regular expressions starting with ``re:``, and each
+    list is matched with a PatternMatcher, so a repository is usually
+    checked with at most two matches.
+
+    Forks, archived repositories and those not pushed to recently are
+    not filtered here: GitHub leaves them out of the listing, see
+    Github.iterRepos.
+
+    The filter is applied to each repository as the listing pages are
+    parsed, and counts the repositories it rejects by reason.
+    """
+
+    def __init__(self, include=(), exclude=(), max_size=None):
+        """
+        Arguments
+
+        include: Name patterns of the repositories to sync.  All
+            repositories when empty.
+        exclude: Name patterns of the repositories never to sync.
+        max_size: Largest repository to sync, in KiB as GitHub reports
+            sizes.  No limit when None.
+        """
+        self._include = _compile(include)
+        self._exclude = _compile(exclude)
+        self.max_size = max_size
+        self.rejected = collections.Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromConfig(cls, config):
+        """Create the filter from the includeRepos, excludeRepos and
+        maxRepoSize (MiB) settings of config, as returned by
+        readConfig."""
+        max_size = config.get('maxRepoSize')
+        return cls(include=(config.get('includeRepos') or "").split(),
+                   exclude=(config.get('excludeRepos') or "").split(),
+                   max_size=max_size * 1024 if max_size is not None else None)
+
+    def reason(self, repo):
+        """Return why the GithubRepo repo is not synced, or None if it
+        is."""
+        if self._include is not None and self._include.match(repo.name) is None:
+            return "not included"
+        if self._exclude is not None and self._exclude.match(repo.name) is not None:
+            return "excluded"
+        if self.max_size is not None and (repo.size or 0) > self.max_size:
+            return "too large"
+        return None
+
+    def accepts(self, repo):
+        """Check if the GithubRepo repo is synced, counting it if not."""
+        reason = self.reason(repo)
+        if reason is None:
+            return True
+        with self._lock:
+            self.rejected[reason] += 1
+        return False
+
+    def summary(self):
+        """Return the number of rejected repositories by reason, as a
+        printable string."""
+        with self._lock:
+            rejected = sorted(self.rejected.items())
+        return ", ".join(f"{count} {reason}" for (reason, count) in rejected) or "none"
+
+
+def parseTime(value):
+    """Parse a GitHub timestamp such as "2024-01-01T00:00:00Z", or the
+    Unix time of push webhook payloads, into an aware datetime.
+    Returns None for None."""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _compile(patterns):
+    expressions = []
+    for pattern in patterns:
+        expression = patternExpression(pattern)
+        if expression is None:
+            expressions.append(re.escape(pattern))
+            continue
+        try:
+            expressions.append(scopedExpression(expression))
+        except re.error as err:
+            raise ValueError(f"Invalid repository pattern {pattern!r}: {err}") from None
+    return PatternMatcher(expressions) if expressions else None
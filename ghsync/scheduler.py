@@ -0,0 +1,91 @@
+import concurrent.futures
+import datetime
+import heapq
+import itertools
+import math
+import threading
+
+from .repofilter import parseTime
+
+# Repositories larger than this, in KiB, are mirrored after all others
+LARGE_REPO_SIZE = 1024 * 1024
+
+def repoPriority(repo, now=None):
+    """Return the scheduling key of the GithubRepo repo, lower first.
+
+    Recently pushed repositories come first, in buckets doubling in
+    age (a day, two days, four days, ...), and the smaller ones first
+    within a bucket.  Repositories over LARGE_REPO_SIZE come last, so
+    they do not hold up the others.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    pushed = parseTime(repo.pushed_at)
+    days = max((now - pushed).total_seconds() / 86400, 0) if pushed else math.inf
+    age = int(math.log2(1 + days)) if days != math.inf else math.inf
+    size = repo.size or 0
+    return (size > LARGE_REPO_SIZE, age, size)
+
+
+class PriorityExecutor:
+    """Thread pool running the submitted calls in priority order.
+
+    Unlike concurrent.futures.ThreadPoolExecutor, which runs calls in
+    the order they were submitted, each free worker takes the pending
+    call with the lowest priority.  Calls of equal priority run in the
+    order they were submitted.  The repository listing arrives most
+    recently pushed first, so the pending calls are mostly reordered by
+    size, and repositories too large to go first are held back.
+    """
+
+    def __init__(self, max_workers=1):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._run, daemon=True,
+                                          name=f"PriorityExecutor-{n}")
+                         for n in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, priority, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) with priority.  Returns a
+        Future."""
+        future = concurrent.futures.Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+            heapq.heappush(self._heap, (priority, next(self._seq), future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def shutdown(self, wait=True):
+        """Run the pending calls, and stop the workers once they are
+        done."""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._shutdown:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                (_, _, future, fn, args, kwargs) = heapq.heappop(self._heap)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as err:
+                future.set_exception(err)
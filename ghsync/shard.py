@@ -0,0 +1,76 @@
+import fcntl
+import hashlib
+import os
+
+class Shard:
+    """One of count disjoint subsets of the repositories of an
+    organization.
+
+    Repositories are assigned to shards by a stable hash of their
+    GitHub id, so every host running the same count agrees on the
+    assignment without talking to the others, and a repository stays
+    in its shard when it is renamed.
+    """
+
+    def __init__(self, index=0, count=1):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec):
+        """Create a shard from an "i/N" specification, with i counted
+        from 0."""
+        try:
+            (index, count) = (int(n) for n in spec.split('/'))
+        except ValueError:
+            raise ValueError(f"Invalid shard '{spec}', expected i/N") from None
+        return cls(index, count)
+
+    def owns(self, repo):
+        """Check if the GitHub repository repo belongs to this shard."""
+        if self.count == 1:
+            return True
+        digest = hashlib.blake2b(str(repo.id).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.count == self.index
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+class ShardLock:
+    """Exclusive lock on a shard for the duration of a run, so an
+    overlapping run of the same shard on this host does not import the
+    same repositories a second time.  The lock is released by the
+    kernel if the process dies."""
+
+    def __init__(self, directory, shard, name="gh_sync"):
+        self.path = os.path.join(directory, f"{name}.shard-{shard.index}-of-{shard.count}.lock")
+        self._fd = None
+
+    def acquire(self):
+        """Take the lock without waiting.  Returns False if another
+        process holds it."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,58 @@
+import sqlite3
+import threading
+import time
+
+class StateStore:
+    """Persistent record of the repositories already mirrored.
+
+    For each GitHub repository the store keeps its fingerprint (the
+    pushed_at and updated_at timestamps), the GitLab project it was
+    mirrored to and the pull mirror URL that was configured.  A
+    repository whose fingerprint and target are unchanged since the
+    last successful mirror does not need any GitLab calls.
+    """
+
+    def __init__(self, path):
+        """Open (creating if needed) the SQLite state database at path."""
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS repos (
+                                  github_id INTEGER PRIMARY KEY,
+                                  full_name TEXT,
+                                  pushed_at TEXT,
+                                  updated_at TEXT,
+                                  gitlab_id INTEGER,
+                                  gitlab_path TEXT,
+                                  mirror_url TEXT,
+                                  synced_at REAL)""")
+
+    def isCurrent(self, gh_repo, gitlab_path, mirror_url):
+        """Check if gh_repo was mirrored to gitlab_path from mirror_url
+        and has not changed since.  Repositories without a fingerprint
+        are never current."""
+        if gh_repo.pushed_at is None and gh_repo.updated_at is None:
+            return False
+        with self._lock:
+            row = self._db.execute("""SELECT pushed_at, updated_at, gitlab_path, mirror_url
+                                      FROM repos WHERE github_id = ?""",
+                                   (gh_repo.id,)).fetchone()
+        return row == (gh_repo.pushed_at, gh_repo.updated_at, gitlab_path, mirror_url)
+
+    def record(self, gh_repo, gl_project, gitlab_path, mirror_url):
+        """Record a successful mirror of gh_repo to gl_project."""
+        with self._lock, self._db:
+            self._db.execute("""INSERT OR REPLACE INTO repos
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                             (gh_repo.id, gh_repo.full_name, gh_repo.pushed_at,
+                              gh_repo.updated_at, gl_project.id, gitlab_path,
+                              mirror_url, time.time()))
+
+    def forget(self, gh_repo):
+        """Drop gh_repo from the store, so the next run checks it."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM repos WHERE github_id = ?", (gh_repo.id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
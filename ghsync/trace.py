@@ -0,0 +1,163 @@
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+from . import metrics
+
+class Tracer:
+    """Timeline of a sync run, for finding its critical path.
+
+    Sync stages are recorded as spans with span(), and Tracer is a
+    transport observer, so registering it with Transport.addObserver
+    records every API request as a span too.  Spans nest per thread,
+    and inherit the attributes of their parent, so the requests made
+    while mirroring a repository carry its name.  The timeline is
+    written as Chrome trace events, which Perfetto and chrome://tracing
+    show with one track per worker thread, or as OTLP-style JSON lines.
+
+    A tracer records nothing until enable() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._spans = []
+        self._threads = {}
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._trace_id = os.urandom(16).hex()
+
+    def enable(self):
+        self.enabled = True
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def _span(self, name, attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        span = {'id': next(self._ids), 'parent': parent['id'] if parent else None,
+                'name': name, 'attrs': dict(parent['attrs'], **attrs) if parent else attrs}
+        stack.append(span)
+        start = time.time()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self._add(span, start, time.time() - start)
+
+    def span(self, name, **attrs):
+        """Record the enclosed block as the span name, with attrs as its
+        attributes."""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._span(name, attrs)
+
+    def record(self, name, start, duration, wait=False, **attrs):
+        """Record a span that already ended, started at the time.time()
+        start and lasting duration seconds, as a child of the current
+        span.  A wait span does not occupy the thread, like the wait
+        for an import polled by the watcher, and is drawn on a track of
+        its own."""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        span = {'id': next(self._ids), 'parent': parent['id'] if parent else None,
+                'name': name, 'attrs': dict(parent['attrs'], **attrs) if parent else attrs,
+                'wait': wait}
+        self._add(span, start, duration)
+
+    def onRequest(self, method, url, status, start, elapsed):
+        """Transport observer: record one HTTP request as a span."""
+        if not self.enabled:
+            return
+        parts = urllib.parse.urlsplit(url)
+        self.record(f"{method} {metrics._endpoint(parts.path)}", start, elapsed,
+                    host=parts.netloc, status=status if status is not None else "error")
+
+    def _add(self, span, start, duration):
+        thread = threading.current_thread()
+        span.update(start=start, duration=duration, tid=thread.ident)
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+            self._spans.append(span)
+
+    def spans(self):
+        """Return the recorded spans, in the order they ended."""
+        with self._lock:
+            return list(self._spans)
+
+    def chromeEvents(self):
+        """Return the spans as a Chrome trace event document."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self._spans)
+            threads = dict(self._threads)
+        events = [{'ph': "M", 'name': "process_name", 'pid': pid, 'tid': 0,
+                   'args': {'name': "gh_sync"}}]
+        for (tid, name) in threads.items():
+            events.append({'ph': "M", 'name': "thread_name", 'pid': pid, 'tid': tid,
+                           'args': {'name': name}})
+        for span in spans:
+            event = {'name': span['name'], 'cat': "wait" if span.get('wait') else "sync",
+                     'pid': pid, 'ts': round(span['start'] * 1e6),
+                     'args': span['attrs']}
+            if span.get('wait'):
+                # Waits overlap each other, async events keep them apart
+                events.append(dict(event, ph="b", tid=span['tid'], id=span['id']))
+                events.append(dict(event, ph="e", tid=span['tid'], id=span['id'],
+                                   ts=round((span['start'] + span['duration']) * 1e6)))
+            else:
+                events.append(dict(event, ph="X", tid=span['tid'],
+                                   dur=round(span['duration'] * 1e6)))
+        return {'traceEvents': events, 'displayTimeUnit': "ms"}
+
+    def otlpLines(self):
+        """Yield the spans as OTLP-style JSON lines, one span a line."""
+        for span in self.spans():
+            start = round(span['start'] * 1e9)
+            attrs = dict(span['attrs'], **{'thread.id': span['tid']})
+            yield json.dumps({
+                'traceId': self._trace_id,
+                'spanId': f"{span['id']:016x}",
+                'parentSpanId': f"{span['parent']:016x}" if span['parent'] else "",
+                'name': span['name'],
+                'startTimeUnixNano': start,
+                'endTimeUnixNano': start + round(span['duration'] * 1e9),
+                'attributes': [{'key': k, 'value': _otlpValue(v)} for (k, v) in attrs.items()],
+            })
+
+    def write(self, path, format="chrome"):
+        """Write the spans to path in format, "chrome" or "otlp"."""
+        with open(path, "w") as f:
+            if format == "otlp":
+                for line in self.otlpLines():
+                    f.write(line + "\n")
+            else:
+                json.dump(self.chromeEvents(), f)
+
+
+_tracer = Tracer()
+
+def getTracer():
+    """Return the process-wide tracer, disabled unless enabled."""
+    return _tracer
+
+
+def _otlpValue(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
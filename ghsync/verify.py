@@ -0,0 +1,145 @@
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+from .gitmirror import gitEnv
+
+class Verifier:
+    """Check that GitLab mirrors hold the same refs as GitHub.
+
+    Both sides are listed with git ls-remote, in parallel, and their
+    branches and tags, wikis included, are reduced to one fingerprint
+    per side.  This costs one small request per side and transfers no
+    objects.
+
+    The fingerprints are kept in the SQLite database at path between
+    runs.  A mirror that differs from GitHub is only reported as
+    drifted once GitHub has not changed since the previous run, since
+    a mirror is expected to lag behind a fresh push for a while.
+    """
+
+    def __init__(self, path, workers=8, credentials=None, git="git", timeout=120):
+        """Create a new verifier.
+
+        Arguments
+
+        path: SQLite database the fingerprints are kept in.
+        workers: Number of git ls-remote commands run at once.
+        credentials: Dictionary of host name to (user, token), see
+            ghsync.gitmirror.gitEnv.
+        git: The git executable.
+        timeout: Seconds after which a git command is killed.
+        """
+        self._credentials = credentials or {}
+        self._git = git
+        self._timeout = timeout
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS fingerprints (
+                                  name TEXT PRIMARY KEY,
+                                  github TEXT,
+                                  gitlab TEXT,
+                                  drifted_since REAL,
+                                  checked_at REAL)""")
+
+    def check(self, name, repo_url, mirror_url, wiki_url=None, mirror_wiki_url=None):
+        """Compare the repository at repo_url (and its wiki at wiki_url)
+        with its mirror at mirror_url (and mirror_wiki_url).
+
+        Returns a future resolving to a Verification.
+        """
+        github = self._pool.submit(self.fingerprint, repo_url, wiki_url)
+        gitlab = self._pool.submit(self.fingerprint, mirror_url, mirror_wiki_url)
+        result = concurrent.futures.Future()
+        lock = threading.Lock()
+        remaining = [2]
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                result.set_result(self._compare(name, github.result(), gitlab.result()))
+            except Exception as err:
+                result.set_result(Verification(name, "error", str(err)))
+        github.add_done_callback(done)
+        gitlab.add_done_callback(done)
+        return result
+
+    def fingerprint(self, url, wiki_url=None):
+        """Return the fingerprint of the branches and tags at url and of
+        its wiki.  A wiki that cannot be listed counts as empty, since
+        GitHub only creates it with the first page."""
+        digest = hashlib.sha256()
+        for ref in self.lsRemote(url):
+            digest.update(ref.encode() + b"\n")
+        if wiki_url is not None:
+            digest.update(b"wiki\n")
+            try:
+                refs = self.lsRemote(wiki_url)
+            except VerifyError:
+                refs = []
+            for ref in refs:
+                digest.update(ref.encode() + b"\n")
+        return digest.hexdigest()
+
+    def lsRemote(self, url):
+        """Return the sorted "SHA REF" lines of the branches and tags
+        at url."""
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0",
+                   **gitEnv(self._credentials, url))
+        r = subprocess.run([self._git, "ls-remote", "--heads", "--tags", url],
+                           env=env, capture_output=True, text=True, timeout=self._timeout)
+        if r.returncode != 0:
+            raise VerifyError(url, r.stderr.strip())
+        return sorted(line.replace("\t", " ") for line in r.stdout.splitlines())
+
+    def _compare(self, name, github, gitlab):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("""SELECT github, drifted_since FROM fingerprints
+                                      WHERE name = ?""", (name,)).fetchone()
+            if github == gitlab:
+                (status, since) = ("ok", None)
+            elif row is not None and row[0] == github:
+                (status, since) = ("drifted", row[1] or now)
+            else:
+                (status, since) = ("pending", (row[1] if row else None) or now)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                                 (name, github, gitlab, since, now))
+        return Verification(name, status, drifted_since=since)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            self._db.close()
+
+
+class Verification:
+    """The result of a check: status is "ok", "pending" (the mirror
+    differs, but GitHub changed since the last run), "drifted" (the
+    mirror differs and GitHub did not change) or "error"."""
+    __slots__ = ('name', 'status', 'detail', 'drifted_since')
+
+    def __init__(self, name, status, detail=None, drifted_since=None):
+        self.name = name
+        self.status = status
+        self.detail = detail
+        self.drifted_since = drifted_since
+
+
+class VerifyError(Exception):
+    def __init__(self, url, stderr):
+        self.url = url
+        self.stderr = stderr
+
+    def __str__(self):
+        return f"git ls-remote {self.url} failed: {self.stderr}"
@@ -0,0 +1,133 @@
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from .trace import getTracer
+
+class ImportWatcher:
+    """Watch many GitLab imports from a single polling loop.
+
+    Each import handed to watch() is polled with importStatus on its own
+    schedule.  The first poll is timed from how long earlier imports in
+    this run took to finish, and later polls back off with jitter, so
+    small repositories are picked up within seconds while large ones
+    are not polled needlessly.  When an import finishes, fails or times
+    out, its callback runs on a small thread pool.
+    """
+
+    def __init__(self, gl, timeout=1800, min_delay=2, max_delay=60, backoff=1.5, workers=4):
+        """Create a new watcher.
+
+        Arguments
+
+        gl: The Gitlab instance used to poll import status.
+        timeout: Seconds after which an unfinished import is given up.
+        min_delay: Shortest time in seconds between two polls of an import.
+        max_delay: Longest time in seconds between two polls of an import.
+        backoff: Factor applied to the delay after each unfinished poll.
+        workers: Number of threads running the callbacks.
+        """
+        self._gl = gl
+        self._timeout = timeout
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._backoff = backoff
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._thread = None
+        self._closing = False
+        # Moving average of the time imports took to finish
+        self._typical = None
+        self.polls = 0
+
+    def watch(self, project, callback, max_polls=None):
+        """Watch the import of a GitLab project.
+
+        callback is called with the final status, "finished", "failed"
+        or "timeout", once the import reaches it, or "deferred" if the
+        import is still running after max_polls polls.  Returns a
+        Future that resolves to the callback's return value.
+        """
+        future = concurrent.futures.Future()
+        entry = {'project': project, 'callback': callback, 'future': future,
+                 'started': time.monotonic(), 'delay': self._firstDelay(),
+                 'polls': 0, 'max_polls': max_polls}
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._schedule(entry)
+        return future
+
+    def close(self):
+        """Wait for every watched import to complete, and its callback
+        to run, then stop the polling loop."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self._pool.shutdown(wait=True)
+
+    def _firstDelay(self):
+        if self._typical is None:
+            return self._min_delay
+        return min(max(self._typical, self._min_delay), self._max_delay)
+
+    def _schedule(self, entry):
+        delay = entry['delay'] * random.uniform(0.8, 1.2)
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), entry))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closing:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                (due, _, entry) = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+
+            try:
+                with getTracer().span('import_poll', project=entry['project'].path):
+                    status = self._gl.importStatus(entry['project'])
+            except Exception:
+                logging.warning(f"Error polling import of {entry['project'].path}", exc_info=True)
+                status = None
+            self.polls += 1
+            entry['polls'] += 1
+            elapsed = time.monotonic() - entry['started']
+            if status == "finished":
+                self._typical = (elapsed if self._typical is None
+                                 else 0.8 * self._typical + 0.2 * elapsed)
+                self._complete(entry, status)
+            elif status == "failed":
+                self._complete(entry, status)
+            elif elapsed > self._timeout:
+                self._complete(entry, "timeout")
+            elif entry['max_polls'] is not None and entry['polls'] >= entry['max_polls']:
+                self._complete(entry, "deferred")
+            else:
+                entry['delay'] = min(entry['delay'] * self._backoff, self._max_delay)
+                with self._cond:
+                    self._schedule(entry)
+
+    def _complete(self, entry, status):
+        def finish():
+            try:
+                entry['future'].set_result(entry['callback'](status))
+            except Exception as err:
+                entry['future'].set_exception(err)
+        self._pool.submit(finish)
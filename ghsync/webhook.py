@@ -0,0 +1,126 @@
+import concurrent.futures
+import hashlib
+import hmac
+import http.server
+import json
+import logging
+import threading
+
+import github
+
+# Largest delivery accepted; GitHub caps payloads at 25 MB
+MAX_BODY = 25 * 1024 * 1024
+
+class WebhookReceiver:
+    """Receive GitHub webhook deliveries and act on them right away.
+
+    Every delivery must carry a valid X-Hub-Signature-256 made with the
+    shared secret.  A push event calls on_push, and a repository event
+    with the "created" action calls on_create, both with the GithubRepo
+    of the payload.  The handlers run on a small thread pool so GitHub
+    gets its answer at once.  A repository with a push already waiting
+    to be handled is not queued a second time.
+    """
+
+    def __init__(self, secret, on_push, on_create, workers=4):
+        """Create a new receiver.
+
+        Arguments
+
+        secret: The webhook secret configured in GitHub.
+        on_push: Called with the GithubRepo of each push event.
+        on_create: Called with the GithubRepo of each created repository.
+        workers: Number of threads running the handlers.
+        """
+        if not secret:
+            raise ValueError("A webhook secret is required")
+        self._secret = secret.encode()
+        self._handlers = {('push', None): on_push,
+                          ('repository', 'created'): on_create}
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.deliveries = 0
+
+    def verify(self, body, signature):
+        """Check the X-Hub-Signature-256 header signature of body."""
+        if not signature or not signature.startswith("sha256="):
+            return False
+        expected = hmac.new(self._secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature[7:], expected)
+
+    def deliver(self, event, body, signature):
+        """Handle one delivery.  Returns the HTTP status to answer with
+        and a short message."""
+        if not self.verify(body, signature):
+            return (401, "invalid signature")
+        if event == 'ping':
+            return (200, "pong")
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return (400, "invalid JSON")
+        key = (event, payload.get('action') if event == 'repository' else None)
+        handler = self._handlers.get(key)
+        if handler is None or 'repository' not in payload:
+            return (202, "ignored")
+        try:
+            repo = github.github.GithubRepo.fromJson(payload['repository'])
+        except (KeyError, TypeError):
+            return (400, "invalid repository")
+        with self._lock:
+            self.deliveries += 1
+            if (key, repo.id) in self._pending:
+                return (202, "already queued")
+            self._pending.add((key, repo.id))
+        self._pool.submit(self._run, key, handler, repo)
+        return (202, "queued")
+
+    def _run(self, key, handler, repo):
+        with self._lock:
+            self._pending.discard((key, repo.id))
+        try:
+            handler(repo)
+        except Exception:
+            logging.critical(f"Error handling {key[0]} event for {repo.full_name}", exc_info=True)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Listen for deliveries on host:port (only local connections by
+        default, for a reverse proxy in front) from a background thread.
+        Returns the server; call its shutdown() to stop it."""
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY:
+                    # Refused before reading, the signature cannot be
+                    # checked without the body
+                    self.close_connection = True
+                    (status, message) = (413 if length > MAX_BODY else 400,
+                                         "invalid Content-Length")
+                else:
+                    body = self.rfile.read(length)
+                    (status, message) = receiver.deliver(self.headers.get("X-GitHub-Event"),
+                                                         body,
+                                                         self.headers.get("X-Hub-Signature-256"))
+                data = json.dumps({'message': message}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        """Wait for the queued handlers to finish."""
+        self._pool.shutdown(wait=True)
@@ -1 +1,2 @@
 from .github import Github
+from .cache import ResponseCache
@@ -0,0 +1,71 @@
+import threading
+
+from transport import loadJson, saveJson
+
+class ResponseCache:
+    """On-disk cache of GitHub list responses for conditional requests.
+
+    Each entry is keyed by URL and holds the ETag and Last-Modified
+    validators, the parsed page and its pagination links.  A 304
+    Not Modified reply is then answered from the cache, and GitHub does
+    not count it against the rate limit.
+    """
+
+    def __init__(self, path):
+        """Load the cache from path.  A missing or unreadable file
+        starts an empty cache.
+
+        Arguments
+
+        path: File the cache is read from and saved to.
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = loadJson(path)
+
+    def conditionalHeaders(self, url):
+        """Return the If-None-Match/If-Modified-Since headers for url."""
+        headers = {}
+        entry = self._entries.get(url)
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def lookup(self, url):
+        """Return the cached (data, links) for url after a 304, or
+        None if url is not cached."""
+        entry = self._entries.get(url)
+        with self._lock:
+            if entry is None or 'links' not in entry:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return (entry['data'], entry['links'])
+
+    def store(self, url, response, data, links):
+        """Cache the parsed data of a 200 response if it carries a
+        validator."""
+        with self._lock:
+            self.misses += 1
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._entries[url] = {'etag': etag,
+                                      'last_modified': last_modified,
+                                      'data': data,
+                                      'links': links}
+
+    def save(self):
+        """Write the cache back to disk, replacing the file atomically."""
+        with self._lock:
+            saveJson(self.path, self._entries)
+
+    def summary(self):
+        total = self.hits + self.misses
+        return (f"GitHub cache: {self.hits} hits, {self.misses} misses "
+                f"({100 * self.hits / total if total else 0:.0f}% served by 304)")
@@ -1,93 +1,383 @@
+import datetime
 import json
-import re
 import requests
 import sys
-from urllib.parse import urljoin
+import threading
+from urllib.parse import urlencode, urljoin
+
+from transport import getTransport, iterPages, linkUrls
+
+# The fields of the GitHub repository listing used by GithubRepo
+_REPO_FIELDS = ('id', 'name', 'full_name', 'ssh_url', 'clone_url',
+                'has_wiki', 'has_pages', 'pushed_at', 'updated_at',
+                'archived', 'fork', 'size')
+
+# GraphQL repository listing, asking only for the fields GithubRepo
+# uses, most recently pushed first.  A null isFork or isArchived lists
+# every repository.
+_REPOS_QUERY = """
+query($login: String!, $first: Int!, $after: String, $isFork: Boolean, $isArchived: Boolean) {
+  owner: %s(login: $login) {
+    repositories(first: $first, after: $after, isFork: $isFork, isArchived: $isArchived,
+                 orderBy: {field: PUSHED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId name nameWithOwner sshUrl url hasWikiEnabled
+        pushedAt updatedAt isArchived isFork diskUsage
+      }
+    }
+  }
+}
+"""
 
 class Github:
     _api_url = 'https://api.github.com/'
     _headers = None
+    _transport = None
+    _cache = None
+    _listing = 'rest'
+
+    def __init__(self, token=None, transport=None, cache=None, listing='rest',
+                 api_url=None, validation=None):
+        """Initialize a connection to the GitHub API.
+
+        Arguments
 
-    def __init__(self, token=None):
+        token: A GitHub access token.
+        transport: The transport.Transport used for all requests.
+            Defaults to the shared process-wide transport.
+        cache: An optional github.cache.ResponseCache used to make
+            repository listings conditional requests.
+        listing: Backend used by iterRepos and getRepos, either "rest"
+            or "graphql".
+        api_url: Base URL of the GitHub API, for GitHub Enterprise or
+            testing.  Defaults to https://api.github.com/.
+        validation: An optional transport.ValidationCache remembering
+            recent validations of the token across runs.
+
+        The token is validated on the first request, not here.
+        """
+        if listing not in ('rest', 'graphql'):
+            raise ValueError(f"Unknown GitHub listing backend: {listing}")
+        if api_url:
+            setattr(self, '_api_url', api_url.rstrip('/') + '/')
         setattr(self, '_headers', {'Authorization': "token "+token})
-        # Check if token is valid
-        r = requests.get(self._api_url, headers=self._headers)
-        if (r.status_code != requests.codes.ok):
-            raise AuthenticationError("Invalid token")
+        setattr(self, '_transport', transport or getTransport())
+        setattr(self, '_cache', cache)
+        setattr(self, '_listing', listing)
+        setattr(self, '_token', token)
+        setattr(self, '_validation', validation)
+        setattr(self, '_validated', False)
+        setattr(self, '_validateLock', threading.Lock())
+
+    def validate(self):
+        """Check that the token is valid, unless that was already done
+        by this instance or, with a validation cache, recently by
+        another run.  Raises AuthenticationError for an invalid token."""
+        with self._validateLock:
+            if self._validated:
+                return
+            if self._validation is None or not self._validation.isValid(self._api_url, self._token):
+                r = self._transport.get(self._api_url, headers=self._headers)
+                if (r.status_code != requests.codes.ok):
+                    raise AuthenticationError("Invalid token")
+                if self._validation is not None:
+                    self._validation.record(self._api_url, self._token)
+            self._validated = True
+
+    @property
+    def _api(self):
+        """The transport, once the token has been validated."""
+        if not self._validated:
+            self.validate()
+        return self._transport
 
-    def getRepos(self, name, type):
-        # Return an empty list if nothing found
-        ghr = []
+    def getRepos(self, name, type, **options):
+        """Return a list of all repositories of a GitHub user or
+        organization.
+
+        Arguments
+
+        name: Name of the user or organization.
+        type: Owner type, either "users" or "orgs".
+        options: The repo_filter, forks, archived and pushed_since
+            options of iterRepos.
+        """
+        return list(self.iterRepos(name, type, **options))
+
+    def iterRepos(self, name, type, per_page=100, prefetch=4, repo_filter=None,
+                  forks=True, archived=True, pushed_since=None):
+        """Yield the repositories of a GitHub user or organization as
+        GithubRepo objects, most recently pushed first, as soon as each
+        page is parsed.
+
+        Forks are left out by the query itself where GitHub allows it
+        (organizations, and GraphQL), and archived repositories with
+        GraphQL.  As the listing is in push order, it stops at the first
+        repository not pushed to since pushed_since.
+
+        Arguments
+
+        name: Name of the user or organization.
+        type: Owner type, either "users" or "orgs".
+        per_page: Repositories requested per page, at most 100.
+        prefetch: Number of pages fetched concurrently once the number
+            of pages is known.
+        repo_filter: Optional filter, such as a ghsync.RepoFilter, whose
+            accepts(repo) method chooses the repositories yielded.
+        forks: List forks.
+        archived: List archived repositories.
+        pushed_since: Only list the repositories pushed to since this
+            GitHub timestamp, such as "2024-01-01T00:00:00Z".
+        """
         # check if type is known
         if (type!='users' and type!='orgs'):
             raise OwnerTypeError(type)
+        if self._listing == 'graphql':
+            repos = self.iterReposGraphQL(name, type, per_page, forks, archived)
+        else:
+            repos = self._iterReposRest(name, type, per_page, prefetch, forks)
+        # A push during the listing moves a repository to the first
+        # page, shifting the others down a page
+        seen = set()
+        for repo in repos:
+            if pushed_since is not None and (repo.pushed_at or "") < pushed_since:
+                break
+            if repo.id in seen or (repo.fork and not forks) or (repo.archived and not archived):
+                continue
+            seen.add(repo.id)
+            if repo_filter is None or repo_filter.accepts(repo):
+                yield repo
+
+    def _iterReposRest(self, name, type, per_page, prefetch, forks):
+        """Yield the repositories of the REST listing, most recently
+        pushed first."""
+        query = {'per_page': per_page, 'sort': "pushed", 'direction': "desc"}
+        if not forks and type == 'orgs':
+            # Users have no equivalent, their forks are left out by
+            # iterRepos
+            query['type'] = "sources"
         url=urljoin(self._api_url, "/".join([type, name, "repos"]))
-        # Indicate if there are more pages of data from GitHub
-        more_pages = True
-        while more_pages:
-            try:
-                r = requests.get(url, headers=self._headers)
-            except:
-                print("Error getting GitHub {type} repositories for {name}",
-                      file=sys.stderr)
-                raise
+        url=f"{url}?{urlencode(query)}"
+        try:
+            for rs in iterPages(self._getPage, url, prefetch):
+                for repo in rs:
+                    yield GithubRepo.fromJson(repo)
+        except requests.RequestException:
+            print(f"Error getting GitHub {type} repositories for {name}",
+                  file=sys.stderr)
+            raise
+        finally:
+            # Also when the listing is stopped early
+            if self._cache is not None:
+                self._cache.save()
+
+    def iterReposGraphQL(self, name, type, per_page=100, forks=True, archived=True):
+        """Yield the repositories of a GitHub user or organization using
+        the GraphQL API, which returns only the fields GithubRepo needs,
+        most recently pushed first.
+
+        GraphQL has no equivalent of the REST has_pages flag, so
+        has_wiki follows hasWikiEnabled alone.
+
+        Arguments
+
+        name: Name of the user or organization.
+        type: Owner type, either "users" or "orgs".
+        per_page: Repositories requested per page, at most 100.
+        forks: List forks.
+        archived: List archived repositories.
+        """
+        if (type!='users' and type!='orgs'):
+            raise OwnerTypeError(type)
+        url = _graphqlUrl(self._api_url)
+        query = _REPOS_QUERY % ('organization' if type == 'orgs' else 'user')
+        variables = {'login': name, 'first': per_page, 'after': None,
+                     'isFork': None if forks else False,
+                     'isArchived': None if archived else False}
+        while True:
+            r = self._api.post(url, headers=self._headers,
+                                     json={'query': query, 'variables': variables})
             if (r.status_code != requests.codes.ok):
                 raise URLNotFound(url)
+            rs = json.loads(r.content)
+            if rs.get('errors') or not rs['data']['owner']:
+                raise ConnectionError(rs.get('errors') or f"Unknown {type} {name}")
+            repos = rs['data']['owner']['repositories']
+            for repo in repos['nodes']:
+                repo = GithubRepo(repo['databaseId'],
+                                  repo['name'],
+                                  repo['nameWithOwner'],
+                                  repo['sshUrl'],
+                                  repo['url'] + '.git',
+                                  repo['hasWikiEnabled'],
+                                  pushed_at=repo['pushedAt'],
+                                  updated_at=repo['updatedAt'],
+                                  archived=repo['isArchived'],
+                                  fork=repo['isFork'],
+                                  size=repo.get('diskUsage'))
+                yield repo
+            if not repos['pageInfo']['hasNextPage']:
+                break
+            variables['after'] = repos['pageInfo']['endCursor']
 
-            rs = json.loads(r.text or r.content)
+    def _getPage(self, url):
+        """Get one page of a repository listing.  Returns the list of
+        repositories, reduced to the fields GithubRepo uses, and the
+        page links as {relation: URL}.
 
-            for repo in rs:
-                repo_has_wiki=repo['has_wiki'] and repo['has_pages']
-                ghr.append(GithubRepo(repo['id'],
-                                      repo['name'],
-                                      repo['full_name'],
-                                      repo['ssh_url'],
-                                      repo['clone_url'],
-                                      repo_has_wiki))
+        With a cache, the request is conditional and a 304 reply is
+        served from the cache.
+        """
+        headers = self._headers
+        if self._cache is not None:
+            headers = dict(self._headers, **self._cache.conditionalHeaders(url))
+        r = self._api.get(url, headers=headers)
+        if r.status_code == requests.codes.not_modified:
+            cached = self._cache.lookup(url)
+            # Pages cached before a field was added to _REPO_FIELDS
+            # are stale, whatever GitHub says
+            if cached is not None and all(f in repo for repo in cached[0][:1]
+                                          for f in _REPO_FIELDS):
+                return cached
+            # Not in the cache after all, ask again unconditionally
+            r = self._api.get(url, headers=self._headers)
+        if (r.status_code != requests.codes.ok):
+            raise URLNotFound(url)
 
-            # Check if there are more pages
-            if "next" in r.links:
-                url = r.links["next"]["url"]
-            else:
-                more_pages = False
+        rs = [{f: repo[f] for f in _REPO_FIELDS}
+              for repo in json.loads(r.content)]
+        links = linkUrls(r)
+        if self._cache is not None:
+            self._cache.store(url, r, rs, links)
+        return (rs, links)
 
-        return ghr
+    def getSource(self, full_name):
+        """Return the full name of the repository at the root of the
+        fork network of full_name, or None if it is not a fork."""
+        url = urljoin(self._api_url, "/".join(['repos', full_name]))
+        r = self._api.get(url, headers=self._headers)
+        if r.status_code != requests.codes.ok:
+            raise URLNotFound(url)
+        source = json.loads(r.content).get('source')
+        return source['full_name'] if source else None
 
-    def createWebHook(self, group, repo, gl_api):
+    def createWebHook(self, group, repo, url, secret=None, events=('push',)):
+        """Create a webhook delivering events to url.
 
+        Arguments
+
+        group: Owner of the repository, or the organization when repo
+            is None.
+        repo: Name of the repository, or None for an organization wide
+            webhook.
+        url: URL the events are posted to.
+        secret: Secret GitHub signs the deliveries with.
+        events: Events to deliver.
+        """
         webhook_data = {
             'name': 'web',
             'active': True,
-            'events': ['push'],
+            'events': list(events),
             'config': ({
-                'url': gl_api,
+                'url': url,
                 'content_type': 'json',
                 'insecure_ssl': '0'
             })
         }
-        #may require additional headers
-        r = requests.post('/'.join([self._api_url, 'repos', group, repo, 'hooks']), headers=self._headers, data=webhook_data)
-        #needs error handling
+        if secret:
+            webhook_data['config']['secret'] = secret
+        if repo is None:
+            path = "/".join(['orgs', group, 'hooks'])
+        else:
+            path = "/".join(['repos', group, repo, 'hooks'])
+        r = self._api.post(urljoin(self._api_url, path),
+                                 headers=self._headers, json=webhook_data)
+        if r.status_code != 201:
+            raise ConnectionError(f"Unable to create webhook for {path} ({r.status_code}): {r.reason}")
 
 
 class GithubRepo:
-    id = -1
-    ssh_url = None
-    name = None
-    has_wiki = False
-    wiki_url = None
-    wiki_ssh_url = None
-
-    def __init__(self, id, name, full_name, ssh_url, clone_url, has_wiki):
-        setattr(self, 'id', id)
-        setattr(self, 'name', name)
-        setattr(self, 'full_name', full_name)
-        setattr(self, 'ssh_url', ssh_url)
-        setattr(self, 'clone_url', clone_url)
-        setattr(self, 'has_wiki', has_wiki)
-        if (has_wiki):
-            setattr(self, 'wiki_url', re.sub(r"\.git$", ".wiki.git", self.clone_url))
-            setattr(self, 'wiki_ssh_url', re.sub(r"\.git$", ".wiki.git", self.ssh_url))
+    __slots__ = ('id', 'name', 'full_name', 'ssh_url', 'clone_url', 'has_wiki',
+                 'pushed_at', 'updated_at', 'archived', 'fork', 'size')
+
+    def __init__(self, id, name, full_name, ssh_url, clone_url, has_wiki,
+                 pushed_at=None, updated_at=None, archived=False, fork=False,
+                 size=None):
+        self.id = id
+        self.name = name
+        self.full_name = full_name
+        self.ssh_url = ssh_url
+        self.clone_url = clone_url
+        self.has_wiki = has_wiki
+        self.pushed_at = pushed_at
+        self.updated_at = updated_at
+        self.archived = archived
+        self.fork = fork
+        # In KiB, None when unknown
+        self.size = size
+
+    def asDict(self):
+        """Return the fields of the repository, as keyword arguments of
+        GithubRepo."""
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    @classmethod
+    def fromJson(cls, repo):
+        """Create a GithubRepo from a repository of the REST API, as
+        found in the listing and in webhook payloads.  The Unix time
+        pushed_at of push payloads is converted to the timestamp format
+        of the listing."""
+        return cls(repo['id'],
+                   repo['name'],
+                   repo['full_name'],
+                   repo['ssh_url'],
+                   repo['clone_url'],
+                   repo['has_wiki'] and repo.get('has_pages', False),
+                   pushed_at=_timestamp(repo.get('pushed_at')),
+                   updated_at=repo.get('updated_at'),
+                   archived=repo.get('archived', False),
+                   fork=repo.get('fork', False),
+                   size=repo.get('size'))
+
+    @property
+    def wiki_url(self):
+        """HTTPS URL of the wiki repository, None without a wiki."""
+        if self.has_wiki:
+            return _wikiUrl(self.clone_url)
+        return None
+
+    @property
+    def wiki_ssh_url(self):
+        """SSH URL of the wiki repository, None without a wiki."""
+        if self.has_wiki:
+            return _wikiUrl(self.ssh_url)
+        return None
+
+
+def _timestamp(value):
+    """Return the GitHub timestamp value, given as a timestamp or a Unix
+    time, as a "2024-01-01T00:00:00Z" timestamp."""
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc) \
+                               .strftime("%Y-%m-%dT%H:%M:%SZ")
+    return value
+
+
+def _graphqlUrl(api_url):
+    """Return the GraphQL endpoint of the REST API at api_url.  GitHub
+    Enterprise serves REST under /api/v3/ and GraphQL at /api/graphql,
+    github.com at the root of api.github.com."""
+    if api_url.endswith("/v3/"):
+        return api_url[:-len("v3/")] + "graphql"
+    return urljoin(api_url, "graphql")
+
+
+def _wikiUrl(url):
+    """Turn a repository URL ending in .git into its wiki URL."""
+    if url.endswith(".git"):
+        return url[:-4] + ".wiki.git"
+    return url
 
 
 class ConnectionError(Exception):
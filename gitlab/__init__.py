@@ -1 +1,2 @@
 from .gitlab import Gitlab
+from .namespaces import NamespaceCache
@@ -1,16 +1,20 @@
+import concurrent.futures
 import json
 import requests
+import threading
 import urllib
 import urllib.parse
 import sys
 
 import github
+from transport import getTransport, iterPages, linkUrls
 
 class Gitlab:
     _api_url = None
     _headers = None
+    _transport = None
 
-    def __init__(self, url, token):
+    def __init__(self, url, token, transport=None, validation=None, namespaces=None):
         """Initailze a connection to a GitLab instance using the v4 API.
 
         Arguments
@@ -18,38 +22,85 @@ class Gitlab:
         url: Base URL to the GitLab instance
         token: A GitLab access token.  The token must have at least the
             API and write_repository scopes.
+        transport: The transport.Transport used for all requests.
+            Defaults to the shared process-wide transport.
+        validation: An optional transport.ValidationCache remembering
+            recent validations of the token across runs.
+        namespaces: An optional NamespaceCache remembering the ids of
+            groups across runs.
+
+        The token is validated on the first request, not here.
         """
         setattr(self, '_api_url', urllib.parse.urljoin(url, "api/v4"))
         setattr(self, '_headers', { 'PRIVATE-TOKEN' : token })
-        try:
-            r = requests.get('/'.join([self._api_url,
-                                       'projects']),
-                             headers=self._headers)
-        except Exception:
-            print(f"Error connecting to \"{self._api_url}\"",
-                  file=sys.stderr)
-            raise
-        if (r.status_code != requests.codes.ok):
-            if r.status_code == 401:
-                raise AuthenticationError("Invalid token")
-            else:
-                raise ConnectionError(r.status.code, r.reason)
+        setattr(self, '_transport', transport or getTransport())
+        # Index of known projects, keyed by lower case "GROUP/PROJECT",
+        # and the namespaces that have been fully indexed.
+        setattr(self, '_projectIndex', {})
+        setattr(self, '_indexedNamespaces', set())
+        setattr(self, '_token', token)
+        setattr(self, '_validation', validation)
+        setattr(self, '_validated', False)
+        setattr(self, '_validateLock', threading.Lock())
+        # Groups resolved by this instance, keyed by lower case full
+        # path, with a lock per path so concurrent callers resolve (and
+        # create) each group once.
+        setattr(self, '_namespaces', {})
+        setattr(self, '_namespaceLocks', {})
+        setattr(self, '_namespaceLock', threading.Lock())
+        setattr(self, '_namespaceCache', namespaces)
+
+    def validate(self):
+        """Check that the token is valid with the cheap version
+        endpoint, unless that was already done by this instance or, with
+        a validation cache, recently by another run.  Raises
+        AuthenticationError for an invalid token."""
+        with self._validateLock:
+            if self._validated:
+                return
+            if self._validation is None or not self._validation.isValid(self._api_url, self._token):
+                try:
+                    r = self._transport.get('/'.join([self._api_url,
+                                               'version']),
+                                     headers=self._headers)
+                except Exception:
+                    print(f"Error connecting to \"{self._api_url}\"",
+                          file=sys.stderr)
+                    raise
+                if (r.status_code != requests.codes.ok):
+                    if r.status_code == 401:
+                        raise AuthenticationError("Invalid token")
+                    else:
+                        raise ConnectionError(r.status_code, r.reason)
+                if self._validation is not None:
+                    self._validation.record(self._api_url, self._token)
+            self._validated = True
+
+    @property
+    def _api(self):
+        """The transport, once the token has been validated."""
+        if not self._validated:
+            self.validate()
+        return self._transport
 
     def findGroup(self, name):
         """Find a GitLab group.
 
         Arguments
 
-        name: Name of the GitLab group to find.
+        name: Name of the GitLab group to find, or the full path of a
+            subgroup, such as "GROUP/SUBGROUP".
+
+        Returns a GitlabGroup, or None if there is no such group.
         """
         group = None
-        r = requests.get('/'.join([self._api_url,
+        r = self._api.get('/'.join([self._api_url,
                                    'groups',
                                    urllib.parse.quote_plus(name)]),
                          headers=self._headers)
         if r.status_code == requests.codes.ok:
-            g = json.loads(r.text or r.content)
-            if g['name'] == name:
+            g = json.loads(r.content)
+            if g['name'] == name or g.get('full_path', '').lower() == name.lower():
                 group = GitlabGroup(g['id'], g['name'], g['path'])
         return group
 
@@ -58,89 +109,252 @@ class Gitlab:
 
         Arguments
 
-        name: Name of the GitLab group
+        name: Name of the GitLab group, or the full path of a subgroup,
+            such as "GROUP/SUBGROUP".  Missing parent groups are created
+            too.
+
+        Returns the GitlabGroup, which may have existed already, with id
+        -1 if it could not be created.
         """
         # Make sure group doesn't exist
         group = self.findGroup(name)
-        if group.id == -1:
-            payload={ 'name': name, 'path': name}
-            r = requests.post('/'.join([self._api_url,
+        if group is None:
+            group = GitlabGroup()
+            (parentPath, _, path) = name.strip('/').rpartition('/')
+            payload = {'name': path, 'path': path}
+            if parentPath:
+                parent = self.resolveNamespace(parentPath, create=True)
+                if parent.id == -1:
+                    return group
+                payload['parent_id'] = parent.id
+            r = self._api.post('/'.join([self._api_url,
                                         'groups']),
                               payload,
                               headers=self._headers)
             if r.status_code == 201:
-                g = json.loads(r.text or r.content)
+                g = json.loads(r.content)
                 group = GitlabGroup(g['id'], g['name'], g['path'])
         return group
 
+    def resolveNamespace(self, path, create=False):
+        """Return the GitlabGroup of the namespace path, such as "GROUP"
+        or "GROUP/SUBGROUP".  Each namespace is looked up once by this
+        instance and, with a NamespaceCache, once across runs.
+
+        Arguments:
+
+        path: Full path of the GitLab group.
+        create: Create the group, and its missing parents, if it does
+            not exist.
+
+        Returns a GitlabGroup, with id -1 if the group does not exist or
+        could not be created.
+        """
+        key = path.strip('/').lower()
+        with self._namespaceLock:
+            lock = self._namespaceLocks.setdefault(key, threading.Lock())
+        with lock:
+            group = self._namespaces.get(key)
+            if group is None and self._namespaceCache is not None:
+                cached = self._namespaceCache.get(self._api_url, key)
+                if cached is not None:
+                    group = GitlabGroup(*cached)
+            if group is None or (group.id == -1 and create):
+                group = (self.createGroup(path) if create else self.findGroup(path)) or GitlabGroup()
+                if group.id != -1 and self._namespaceCache is not None:
+                    self._namespaceCache.record(self._api_url, key,
+                                                group.id, group.name, group.path)
+            self._namespaces[key] = group
+        return group
+
+    def forgetNamespace(self, path):
+        """Drop the resolved id of the namespace path, for instance when
+        GitLab no longer accepts it."""
+        key = path.strip('/').lower()
+        with self._namespaceLock:
+            self._namespaces.pop(key, None)
+        if self._namespaceCache is not None:
+            self._namespaceCache.forget(self._api_url, key)
+
+    def provisionNamespaces(self, paths, workers=8):
+        """Resolve many namespaces at once, creating the missing ones,
+        with up to workers concurrent requests.  Each namespace, and
+        each parent shared by several subgroups, is resolved once.
+
+        Returns a dict of the GitlabGroup of each path, with id -1 for
+        those that could not be created.
+        """
+        paths = list(dict.fromkeys(paths))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            groups = pool.map(lambda path: self.resolveNamespace(path, create=True), paths)
+            return dict(zip(paths, groups))
+
+    def provision(self, projects, workers=8):
+        """Create many projects at once, along with their groups.  The
+        groups are resolved first, each once, then the projects are
+        looked up and the missing ones created, with up to workers
+        concurrent requests.
+
+        Arguments:
+
+        projects: (group, name) pairs, where group is the full path of
+            the GitLab group of the project called name.
+        workers: Number of concurrent requests.
+
+        Returns a dict of the GitlabProject of each (group, name), with
+        id -1 for those that could not be created.
+        """
+        projects = list(dict.fromkeys(projects))
+        groups = self.provisionNamespaces((group for (group, _) in projects), workers)
+        def create(item):
+            (group, name) = item
+            project = self.findProject(name, group)
+            if project.id == -1 and groups[group].id != -1:
+                project = self.createProject(name, groups[group])
+            return project
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(projects, pool.map(create, projects)))
+
     def findProject(self, name, group=None):
         """Find a GitLab project, and return a GitlabProject object.
 
+        Projects in a namespace loaded by indexGroupProjects are
+        answered from the index without an API call.
+
         Arguments:
 
         name: GitLab project name to find.
         group: GitLab group that should contain the project.
         """
         # An Empty project as a default return
-        project = GitlabProject
+        project = GitlabProject()
         if group != None:
             grpName=""
             if isinstance(group, str):
                 grpName = group
             elif isinstance(group, GitlabGroup):
                 grpName = group.name
-            projectUrl = urllib.parse.quote_plus('/'.join([grpName, name]))
-            r = requests.get('/'.join([self._api_url,
-                                       'projects',
-                                       projectUrl]),
-                                       headers=self._headers,
-                                       allow_redirects=False)
-            if r.status_code == requests.codes.ok:
-                p = json.loads(r.text or r.content)
-                project = GitlabProject(p['id'],
-                                        p['path'],
-                                        p['path_with_namespace'],
-                                        p['web_url'],
-                                        p['wiki_enabled'])
+            key = '/'.join([grpName, name]).lower()
+            if key in self._projectIndex:
+                project = self._projectIndex[key]
+            elif grpName.lower() not in self._indexedNamespaces:
+                project = self._getProject(name, grpName)
+        return project
+
+    def _getProject(self, name, grpName):
+        """Look up GROUP/PROJECT with the API, bypassing the index, and
+        add the result to the index."""
+        project = GitlabProject()
+        projectUrl = urllib.parse.quote_plus('/'.join([grpName, name]))
+        r = self._api.get('/'.join([self._api_url,
+                                   'projects',
+                                   projectUrl]),
+                                   headers=self._headers,
+                                   allow_redirects=False)
+        if r.status_code == requests.codes.ok:
+            p = json.loads(r.content)
+            project = self._indexProject(p)
         return project
 
+    def _indexProject(self, p):
+        """Create a GitlabProject from the API representation p and
+        record it in the project index."""
+        project = GitlabProject(p['id'],
+                                p['path'],
+                                p['path_with_namespace'],
+                                p['web_url'],
+                                p['wiki_enabled'],
+                                import_status=p.get('import_status'),
+                                mirror=p.get('mirror', False),
+                                import_url=p.get('import_url'))
+        self._projectIndex[p['path_with_namespace'].lower()] = project
+        return project
+
+    def indexGroupProjects(self, group, include_subgroups=False, prefetch=4):
+        """Load every project in a GitLab group into the project index,
+        100 projects per request.  Later findProject calls for this
+        group are answered from the index, and a project missing from
+        the index is known not to exist.
+
+        Arguments:
+
+        group: GitLab group, as a name or a GitlabGroup object.
+        include_subgroups: Also index the projects of all subgroups.
+        prefetch: Number of pages fetched concurrently once the number
+            of pages is known.
+
+        Returns the number of projects indexed.
+        """
+        grpName = group.name if isinstance(group, GitlabGroup) else group
+        query = urllib.parse.urlencode({'per_page': 100,
+                                        'include_subgroups': str(include_subgroups).lower()})
+        url = '/'.join([self._api_url,
+                        'groups',
+                        urllib.parse.quote_plus(grpName),
+                        'projects']) + '?' + query
+        count = 0
+        namespaces = {grpName.lower()}
+        for page in self._iterPages(url, prefetch):
+            for p in page:
+                self._indexProject(p)
+                # Subgroups are listed in full too
+                namespaces.add(p['namespace']['full_path'].lower())
+                count += 1
+        self._indexedNamespaces.update(namespaces)
+        return count
+
+    def _iterPages(self, url, prefetch=4):
+        """Yield the decoded pages of a paginated GitLab listing."""
+        def fetch(u):
+            r = self._api.get(u, headers=self._headers)
+            if r.status_code != requests.codes.ok:
+                raise ConnectionError(r.status_code, r.reason)
+            return (json.loads(r.content), linkUrls(r))
+        return iterPages(fetch, url, prefetch)
+
     def createProject(self, name, group, wiki_enabled=False):
         """Create a GitLab project within the GitLab group.
 
         Arguments:
 
         name: GitLab project name to create
-        group: GitLab group to use to create the project.  The group
-               will be created if it doesn't exist.
+        group: GitLab group to use to create the project, as a full path
+               or a GitlabGroup.  The group will be created if it
+               doesn't exist.
         wiki_enabled: Indicate if the wiki should be enabled for this
                project.
         """
         project = GitlabProject()
-        g = GitlabGroup()
-        # Check if group exists, if not create group
-        if isinstance(group, str):
-            g = self.findGroup(group)
-        elif isinstance(group, GitlabGroup):
-            g = self.findGroup(group.name)
-        if g.id < 0:
-            if isinstance(group, str):
-                g = self.createGroup(group)
-            elif isinstance(group, GitlabGroup):
-                g = self.createGroup(group.name)
+        # Resolve the group once, creating it if needed
+        if isinstance(group, GitlabGroup) and group.id != -1:
+            g = group
+        else:
+            grpName = group.name if isinstance(group, GitlabGroup) else group
+            g = self.resolveNamespace(grpName, create=True)
+        if g.id == -1:
+            return project
         payload = { 'name': name, 'namespace_id': g.id, 'wiki_enabled': str(wiki_enabled).lower() }
-        r = requests.post('/'.join([self._api_url,'projects']), payload, headers=self._headers)
+        r = self._api.post('/'.join([self._api_url,'projects']), payload, headers=self._headers)
+        if g is not group and _namespaceError(r):
+            # The group id is stale, from a group deleted since it was
+            # resolved.  Resolve it again and retry once.
+            self.forgetNamespace(grpName)
+            g = self.resolveNamespace(grpName, create=True)
+            if g.id == -1:
+                return project
+            payload['namespace_id'] = g.id
+            r = self._api.post('/'.join([self._api_url,'projects']), payload, headers=self._headers)
         if r.status_code == 201:
-            p = json.loads(r.text or r.content)
-            project = GitlabProject(p['id'], p['path'], p['path_with_namespace'],
-                                    p['web_url'], p['wiki_enabled'])
+            p = json.loads(r.content)
+            project = self._indexProject(p)
         return project
 
     def touchProjectWiki(self, project):
         """Does a simple get request on the wiki url to force the
         creating of the wiki repository."""
-        r = requests.get(project.wiki_url, headers=self._headers)
+        r = self._api.get(project.wiki_url, headers=self._headers)
 
-    def importGitHub(self, gh, gh_repo, gl_group):
+    def importGitHub(self, gh, gh_repo, gl_group, gl_project=None):
         """Import a GitHub public repository to a GitLab namespace.
         The repository name will be the same as the GitHub repository
         name.
@@ -153,6 +367,9 @@ class Gitlab:
 
         gl_group: The GitLab group where to place the imported GitHub
                   repository.
+        gl_project: The project named after gh_repo in gl_group, as
+                  already found by findProject, so it is not looked up
+                  again.
         """
         # Check that we can get the Github repository from the passed in instance
         if not isinstance(gh, github.Github):
@@ -170,7 +387,8 @@ class Gitlab:
 
         # Check if the GitLab project already exists, instead of just doing the PUSH
         # If it exists, just return the project object
-        gl_project = self.findProject(gh_repo_name, gl_group)
+        if gl_project is None:
+            gl_project = self.findProject(gh_repo_name, gl_group)
         if gl_project.id == -1:
             # The GitLab project doesn't exist, start the import
             gl_payload = {
@@ -178,10 +396,10 @@ class Gitlab:
                 "repo_id": gh_repo.id,
                 "target_namespace": gl_group,
             }
-            r = requests.post('/'.join([self._api_url, 'import', 'github']), gl_payload, headers=self._headers)
+            r = self._api.post('/'.join([self._api_url, 'import', 'github']), gl_payload, headers=self._headers)
             if r.status_code == 201:
-                # Project created
-                gl_project = self.findProject(gh_repo_name, gl_group)
+                # Project created, fetch it and add it to the index
+                gl_project = self._getProject(gh_repo_name, gl_group)
         return gl_project
 
     def importStatus(self, proj):
@@ -193,6 +411,7 @@ class Gitlab:
         """
         # Determine what type was passed
         proj_id = ""
+        project = GitlabProject()
         if isinstance(proj, str):
             try:
                 [gl_group, gl_proj] = proj.split("/")
@@ -204,15 +423,20 @@ class Gitlab:
                 raise
         elif isinstance(proj, GitlabProject):
             proj_id = str(proj.id)
-        r = requests.get('/'.join([self._api_url,
+            project = proj
+        # A finished import cannot change, so trust the indexed status
+        if project.import_status == "finished":
+            return project.import_status
+        r = self._api.get('/'.join([self._api_url,
                                    'projects',
                                    proj_id,
                                    "import"]),
                         headers=self._headers)
         status = None
         if r.status_code == requests.codes.ok:
-            p = json.loads(r.text or r.content)
+            p = json.loads(r.content)
             status = p['import_status']
+            project.import_status = status
         else:
             print(f"Error getting import status: {r.status_code} {r.reason}",
                   file=sys.stderr)
@@ -228,12 +452,15 @@ class Gitlab:
                  can be a type(GitlabProject), a string GROUP/PROJ, or
                  an integer with the GitLab ID.
         gh_repo: The full URL to a GitHub repository to pull from.
+
+        A GitlabProject given as gl_proj, which may be the one held in
+        the project index, is marked as pull mirrored from gh_repo.
         """
         gl_proj_id = ""
         gl_proj_name = ""
         if isinstance(gl_proj, str):
             try:
-                [gl_group, gl_proj] = gl_proj.spli("/")
+                [gl_group, gl_proj] = gl_proj.split("/")
                 project = self.findProject(gl_proj, gl_group)
                 gl_proj_id = str(project.id)
                 gl_proj_name = project.name
@@ -252,16 +479,17 @@ class Gitlab:
         # for this URL
         # Code of 200 means the repository is mirrored
         # Code of 400 means the repository is not mirrored
-        r = requests.get("/".join([self._api_url,
+        r = self._api.get("/".join([self._api_url,
                                    "projects",
                                    gl_proj_id,
                                    "mirror/pull"]),
                          headers=self._headers)
         if r.status_code == 200:
             # Check the URL
-            p = json.loads(r.text or r.content)
+            p = json.loads(r.content)
             if p["url"] == github_mirror_url:
                 # We do need to push a new configuration
+                self._markMirrored(gl_proj, github_mirror_url)
                 return True
         elif r.status_code != 400:
             # Other status codes put us in a strange state.
@@ -270,45 +498,95 @@ class Gitlab:
         # If we are here, update the pull configuration
         payload = {"enabled": "true",
                     "url": github_mirror_url}
-        r = requests.put("/".join([self._api_url,
+        r = self._api.put("/".join([self._api_url,
                                     "projects",
                                     gl_proj_id,
                                     "mirror/pull"]),
                             payload,
                             headers=self._headers)
+        self._markMirrored(gl_proj, github_mirror_url)
         return True
 
+    @staticmethod
+    def _markMirrored(gl_proj, url):
+        if isinstance(gl_proj, GitlabProject):
+            gl_proj.mirror = True
+            gl_proj.import_url = url
+
+    def startPullMirror(self, gl_proj):
+        """Ask GitLab to pull from the mirrored repository now, instead
+        of waiting for its next scheduled update.
+
+        Arguments:
+
+        gl_proj: The GitLab project, already configured to pull mirror.
+
+        Returns True if the update was started.
+        """
+        r = self._api.post("/".join([self._api_url,
+                                           "projects",
+                                           str(gl_proj.id),
+                                           "mirror/pull"]),
+                                 headers=self._headers)
+        if r.status_code not in (200, 202, 204):
+            print(f"Error starting pull mirror of {gl_proj.name}: {r.status_code} {r.reason}",
+                  file=sys.stderr)
+            return False
+        return True
+
+
+
+def _namespaceError(r):
+    """Check if the failed project creation r was refused for its
+    namespace, as opposed to its name or path."""
+    if r.status_code not in (400, 404):
+        return False
+    try:
+        message = json.loads(r.content).get('message')
+    except (ValueError, AttributeError):
+        return False
+    if isinstance(message, dict):
+        return 'namespace' in message or 'namespace_id' in message
+    return "namespace" in str(message).lower()
+
 
 class GitlabGroup:
-    id = -1
-    name = None
-    path = None
+    __slots__ = ('id', 'name', 'path')
 
     def __init__(self, id=-1, name=None, path=None):
-        setattr(self, 'id', id)
-        setattr(self, 'name', name)
-        setattr(self, 'path', path)
+        self.id = id
+        self.name = name
+        self.path = path
 
 
 class GitlabProject:
-    id = -1
-    wiki_enabled = False
-    name = None
-    path = None
-    web_url = None
-    wiki_url = None
-    wiki_path = None
-
-    def __init__(self, id=-1, name=None, path=None, url=None, wiki_enabled=False):
-        setattr(self, 'id', id)
-        setattr(self, 'name', name)
-        setattr(self, 'web_url', url)
-        setattr(self, 'wiki_enabled', wiki_enabled)
-        if path:
-            setattr(self, 'path', path)
-        if wiki_enabled:
-            setattr(self, 'wiki_url', url+'/wikis/home')
-            setattr(self, 'wiki_path', path+'.wiki.git')
+    __slots__ = ('id', 'name', 'path', 'web_url', 'wiki_enabled',
+                 'import_status', 'mirror', 'import_url')
+
+    def __init__(self, id=-1, name=None, path=None, url=None, wiki_enabled=False,
+                 import_status=None, mirror=False, import_url=None):
+        self.id = id
+        self.name = name
+        self.path = path or None
+        self.web_url = url
+        self.wiki_enabled = wiki_enabled
+        self.import_status = import_status
+        self.mirror = mirror
+        self.import_url = import_url
+
+    @property
+    def wiki_url(self):
+        """URL of the project wiki home page, None without a wiki."""
+        if self.wiki_enabled:
+            return self.web_url + '/wikis/home'
+        return None
+
+    @property
+    def wiki_path(self):
+        """Path of the project wiki repository, None without a wiki."""
+        if self.wiki_enabled:
+            return self.path + '.wiki.git'
+        return None
 
 
 class AuthenticationError(Exception):
@@ -0,0 +1,49 @@
+import threading
+
+from transport import loadJson, saveJson
+
+class NamespaceCache:
+    """Remember the ids of GitLab groups across runs, so each namespace
+    is looked up once, not once per project created in it.
+
+    Entries are keyed by the API URL and the lower case full path of
+    the group, such as "group/subgroup", and saved on every change.
+    Group ids do not change unless a group is deleted and created
+    again, in which case the entry is dropped with forget().
+    """
+
+    def __init__(self, path):
+        """Open (creating if needed) the cache at path."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = loadJson(path)
+
+    @staticmethod
+    def key(url, path):
+        return f"{url} {path.strip('/').lower()}"
+
+    def get(self, url, path):
+        """Return the (id, name, path) of the group path of the GitLab
+        API at url, or None if it is not known."""
+        with self._lock:
+            entry = self._entries.get(self.key(url, path))
+        return tuple(entry) if entry is not None else None
+
+    def record(self, url, path, id, name, group_path):
+        """Record the id, name and path of the group path."""
+        with self._lock:
+            self._entries[self.key(url, path)] = [id, name, group_path]
+            self._save()
+
+    def forget(self, url, path):
+        """Drop the group path, whose id turned out to be stale."""
+        with self._lock:
+            if self._entries.pop(self.key(url, path), None) is not None:
+                self._save()
+
+    def _save(self):
+        try:
+            saveJson(self.path, self._entries)
+        except OSError:
+            # Only costs a group lookup next run
+            pass
@@ -0,0 +1,84 @@
+"""Benchmark building GithubRepo and GitlabProject records.
+
+Decodes a synthetic organization listing from bytes and builds one
+record per repository, reporting the time per record and the memory
+the records hold.  Run from the top of the repository:
+
+    python3 -m tests.bench_models --count 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from github.github import GithubRepo
+from gitlab.gitlab import GitlabProject
+
+
+def githubListing(count):
+    """Return a GitHub repository listing of count repositories, as bytes."""
+    return json.dumps([
+        {'id': n, 'name': f"repo{n}", 'full_name': f"org/repo{n}",
+         'ssh_url': f"git@github.com:org/repo{n}.git",
+         'clone_url': f"https://github.com/org/repo{n}.git",
+         'has_wiki': n % 2 == 0, 'pushed_at': "2024-01-01T00:00:00Z",
+         'updated_at': "2024-01-01T00:00:00Z", 'archived': False,
+         'fork': False}
+        for n in range(count)]).encode()
+
+
+def gitlabListing(count):
+    """Return a GitLab project listing of count projects, as bytes."""
+    return json.dumps([
+        {'id': n, 'name': f"repo{n}", 'path': f"repo{n}",
+         'web_url': f"https://gitlab.example.com/group/repo{n}",
+         'wiki_enabled': n % 2 == 0, 'import_status': "finished",
+         'mirror': True}
+        for n in range(count)]).encode()
+
+
+def buildRepos(content):
+    return [GithubRepo(r['id'], r['name'], r['full_name'], r['ssh_url'],
+                       r['clone_url'], r['has_wiki'], r['pushed_at'],
+                       r['updated_at'], r['archived'], r['fork'])
+            for r in json.loads(content)]
+
+
+def buildProjects(content):
+    return [GitlabProject(p['id'], p['name'], p['path'], p['web_url'],
+                          p['wiki_enabled'], p['import_status'], p['mirror'])
+            for p in json.loads(content)]
+
+
+def measure(build, content):
+    """Build the records from content.  Returns (seconds, bytes still
+    allocated by the decoded records)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = build(content)
+    elapsed = time.perf_counter() - start
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return (elapsed, size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000,
+                        help="Number of records to build")
+    args = parser.parse_args()
+
+    print(f"{'model':>14} {'records':>8} {'total (s)':>10} {'us/record':>10} "
+          f"{'MiB':>8} {'bytes/record':>13}")
+    for (name, build, content) in (
+            ("GithubRepo", buildRepos, githubListing(args.count)),
+            ("GitlabProject", buildProjects, gitlabListing(args.count))):
+        (elapsed, size) = measure(build, content)
+        print(f"{name:>14} {args.count:>8} {elapsed:>10.3f} "
+              f"{1e6 * elapsed / args.count:>10.2f} {size / 2**20:>8.1f} "
+              f"{size / args.count:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark gh_sync end to end against the simulated API server.
+
+Runs gh_sync once per organization size and reports the wall time, the
+number of API requests it made and its peak RSS.  Run from the top of
+the repository:
+
+    python3 -m tests.bench_sync --sizes 100 1000 10000 --workers 16
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import fakeapi
+
+GH_SYNC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gh_sync")
+
+
+def writeConfig(api, workdir, extra=""):
+    """Write a gh_sync.conf for api to workdir, followed by the extra
+    configuration text."""
+    with open(os.path.join(workdir, "gh_sync.conf"), "w") as f:
+        f.write("[global]\n"
+                f"gitLabUrl: {api.url}\n"
+                f"gitHubUrl: {api.github_url}\n"
+                f"gitHubOrgName: {api.org}\n"
+                f"gitLabNSpace: {api.group}\n"
+                f"gitLabRepos: {workdir}/repositories\n"
+                "gitHubToken: github-token\n"
+                "gitLabToken: gitlab-token\n"
+                f"logDir: {workdir}\n" + extra)
+
+
+def runSync(api, workdir, args=(), extra=""):
+    """Run gh_sync against api with workdir as the current and log
+    directory, with the extra configuration text.  Returns (exit
+    status, wall seconds, peak RSS in MiB)."""
+    writeConfig(api, workdir, extra)
+    start = time.monotonic()
+    proc = subprocess.Popen([sys.executable, GH_SYNC, *args], cwd=workdir,
+                            stdout=subprocess.DEVNULL)
+    (_, status, rusage) = os.wait4(proc.pid, 0)
+    elapsed = time.monotonic() - start
+    # ru_maxrss is in KiB on Linux
+    return (os.waitstatus_to_exitcode(status), elapsed, rusage.ru_maxrss / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Organization sizes to benchmark")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="Seconds added to every API response")
+    parser.add_argument("--import-duration", type=float, default=2.0,
+                        help="Seconds a GitLab import takes")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of API requests that fail")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="API requests allowed per hour, per API")
+    parser.add_argument("sync_args", nargs="*",
+                        help="Extra gh_sync arguments, after --")
+    args = parser.parse_args()
+
+    print(f"{'repos':>7} {'run':>8} {'status':>6} {'wall (s)':>9} {'requests':>9} "
+          f"{'repos/min':>10} {'peak RSS (MiB)':>15}")
+    for size in args.sizes:
+        api = fakeapi.FakeApi(repos=size, latency=args.latency,
+                              import_duration=args.import_duration,
+                              error_rate=args.error_rate,
+                              rate_limit=args.rate_limit)
+        with api, tempfile.TemporaryDirectory() as workdir:
+            # A first run imports everything, a second run finds
+            # everything already mirrored
+            for run in ("initial", "repeat"):
+                api.requests.clear()
+                (status, elapsed, rss) = runSync(api, workdir, args.sync_args)
+                print(f"{size:>7} {run:>8} {status:>6} {elapsed:>9.2f} "
+                      f"{sum(api.requests.values()):>9} {60 * size / elapsed:>10.0f} "
+                      f"{rss:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""Simulated GitHub and GitLab API server for offline tests and benchmarks.
+
+The server implements the endpoints used by the Github and Gitlab
+clients.  GitHub is served under /github/ and GitLab under /api/v4/ on
+the same port.  Latency, import duration, error rate and rate limits are
+configurable, and every request is counted per endpoint.
+"""
+import collections
+import hashlib
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+
+class FakeApi:
+    def __init__(self, org="test-org", group="test-group", repos=100,
+                 latency=0.0, import_duration=0.0, error_rate=0.0,
+                 rate_limit=None, rate_window=3600):
+        """Create a fake API for an organization of synthetic repositories.
+
+        Arguments
+
+        org: Name of the GitHub organization.
+        group: Name of the GitLab group, which already exists.
+        repos: Number of repositories in the GitHub organization.
+        latency: Seconds added to every response.
+        import_duration: Seconds a GitLab import takes to finish.
+        error_rate: Fraction of requests answered with a 500 error.
+        rate_limit: Requests allowed per rate_window for each API, or
+            None for no limit.  Rate limit headers are always sent.
+        rate_window: Length in seconds of the rate limit window.
+        """
+        self.org = org
+        self.group = group
+        self.latency = latency
+        self.import_duration = import_duration
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        self._budget = {}
+        self.repos = [_githubRepo(org, n) for n in range(1, repos + 1)]
+        self.groups = {group.lower(): {'id': 1, 'name': group, 'path': group,
+                                       'full_path': group, 'parent_id': None}}
+        self.projects = {}
+        self.mirrors = {}
+        self.imports = {}
+        self._httpd = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    @property
+    def github_url(self):
+        return self.url + "/github/"
+
+    def start(self):
+        """Start serving on a free localhost port in a background thread."""
+        api = self
+
+        class Handler(_Handler):
+            fake = api
+
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def addProject(self, namespace, name, import_status="finished"):
+        """Create a GitLab project directly, as if it already existed."""
+        with self._lock:
+            return self._addProject(namespace, name, import_status)
+
+    def _addProject(self, namespace, name, import_status):
+        pid = len(self.projects) + 1
+        full_path = f"{namespace}/{name}"
+        p = {'id': pid, 'name': name, 'path': name,
+             'path_with_namespace': full_path, 'full_path': full_path,
+             'web_url': f"{self.url}/{full_path}", 'wiki_enabled': True,
+             'import_status': import_status, 'mirror': False,
+             'namespace': {'full_path': namespace}}
+        self.projects[pid] = p
+        return p
+
+    def _rateLimit(self, api):
+        """Take one request from the api budget.  Returns the rate
+        limit headers and whether the request is allowed."""
+        now = time.time()
+        (window, used) = self._budget.get(api, (now, 0))
+        if now - window >= self.rate_window:
+            (window, used) = (now, 0)
+        used += 1
+        self._budget[api] = (window, used)
+        limit = self.rate_limit or 1000000
+        reset = str(int(window + self.rate_window))
+        remaining = str(max(0, limit - used))
+        prefix = "X-RateLimit-" if api == "github" else "RateLimit-"
+        headers = {prefix + "Limit": str(limit), prefix + "Remaining": remaining,
+                   prefix + "Reset": reset}
+        allowed = self.rate_limit is None or used <= limit
+        if not allowed:
+            headers["Retry-After"] = str(max(1, int(window + self.rate_window - now)))
+        return (headers, allowed)
+
+
+def _githubRepo(org, n):
+    name = f"repo-{n:05d}"
+    return {'id': 1000 + n, 'node_id': f"R_{n}", 'name': name,
+            'full_name': f"{org}/{name}", 'private': False,
+            'description': f"Synthetic repository {n}",
+            'html_url': f"https://github.com/{org}/{name}",
+            'ssh_url': f"git@github.com:{org}/{name}.git",
+            'clone_url': f"https://github.com/{org}/{name}.git",
+            'has_wiki': n % 3 == 0, 'has_pages': n % 6 == 0,
+            'pushed_at': f"2024-{1 + n % 12:02d}-{1 + n % 28:02d}T00:00:00Z",
+            'updated_at': "2024-01-01T00:00:00Z",
+            'archived': n % 50 == 0, 'fork': n % 20 == 0,
+            'size': (n * 7919) % 500000, 'default_branch': "main",
+            'language': "Fortran", 'stargazers_count': n % 17}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def _dispatch(self, method):
+        fake = self.fake
+        parts = urllib.parse.urlsplit(self.path)
+        self.query = dict(urllib.parse.parse_qsl(parts.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if body and self.headers.get("Content-Type", "").startswith("application/json"):
+            self.data = json.loads(body)
+        else:
+            self.data = dict(urllib.parse.parse_qsl(body.decode()))
+        api = "github" if parts.path.startswith("/github/") else "gitlab"
+        route = None
+        for (m, pattern, handler) in _ROUTES:
+            match = re.fullmatch(pattern, parts.path)
+            if m == method and match:
+                route = (pattern, handler, match)
+                break
+        endpoint = f"{method} {route[0] if route else parts.path}"
+        with fake._lock:
+            fake.requests[endpoint] += 1
+            (self.extra_headers, allowed) = fake._rateLimit(api)
+        if fake.latency:
+            time.sleep(fake.latency)
+        if not allowed:
+            return self._reply(429 if api == "gitlab" else 403, {'message': "rate limited"})
+        if fake.error_rate and random.random() < fake.error_rate:
+            return self._reply(500, {'message': "simulated error"})
+        if route is None:
+            return self._reply(404, {'message': "404 Not Found"})
+        with fake._lock:
+            route[1](self, *[urllib.parse.unquote(g) for g in route[2].groups()])
+
+    def _reply(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for (k, v) in dict(self.extra_headers, **(headers or {})).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _paginate(self, items, base):
+        """Reply with one page of items and a Link header."""
+        per_page = int(self.query.get("per_page", 30))
+        page = int(self.query.get("page", 1))
+        last = max(1, (len(items) + per_page - 1) // per_page)
+        data = items[(page - 1) * per_page:page * per_page]
+        links = []
+        query = dict(self.query, per_page=str(per_page))
+        for (rel, n) in (("next", page + 1), ("last", last)):
+            if page < last:
+                url = f"{self.fake.url}{base}?{urllib.parse.urlencode(dict(query, page=str(n)))}"
+                links.append(f'<{url}>; rel="{rel}"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        etag = '"' + hashlib.sha1(json.dumps(data).encode()).hexdigest() + '"'
+        headers["ETag"] = etag
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            for (k, v) in dict(self.extra_headers, **headers).items():
+                self.send_header(k, v)
+            self.end_headers()
+            return
+        self._reply(200, data, headers)
+
+    # GitHub
+
+    def githubRoot(self):
+        self._reply(200, {'current_user_url': self.fake.github_url + "user"})
+
+    def githubUser(self):
+        self._reply(200, {'login': "tester", 'id': 1})
+
+    def githubRepos(self, owner_type, owner):
+        if owner.lower() != self.fake.org.lower():
+            return self._reply(404, {'message': "Not Found"})
+        repos = self.fake.repos
+        if owner_type == "orgs" and self.query.get('type') == "sources":
+            repos = [r for r in repos if not r['fork']]
+        if self.query.get('sort') == "pushed":
+            repos = sorted(repos, key=lambda r: r['pushed_at'],
+                           reverse=self.query.get('direction') == "desc")
+        self._paginate(repos, f"/github/{owner_type}/{owner}/repos")
+
+    def githubGraphql(self):
+        variables = self.data.get('variables', {})
+        first = variables.get('first', 100)
+        start = int(variables.get('after') or 0)
+        repos = self.fake.repos
+        if variables.get('isFork') is not None:
+            repos = [r for r in repos if r['fork'] == variables['isFork']]
+        if variables.get('isArchived') is not None:
+            repos = [r for r in repos if r['archived'] == variables['isArchived']]
+        if "PUSHED_AT" in self.data.get('query', ""):
+            repos = sorted(repos, key=lambda r: r['pushed_at'], reverse=True)
+        total = len(repos)
+        repos = repos[start:start + first]
+        nodes = [{'databaseId': r['id'], 'name': r['name'],
+                  'nameWithOwner': r['full_name'], 'sshUrl': r['ssh_url'],
+                  'url': r['html_url'], 'hasWikiEnabled': r['has_wiki'],
+                  'pushedAt': r['pushed_at'], 'updatedAt': r['updated_at'],
+                  'isArchived': r['archived'], 'isFork': r['fork'],
+                  'diskUsage': r['size']}
+                 for r in repos]
+        end = start + len(repos)
+        self._reply(200, {'data': {'owner': {'repositories': {
+            'pageInfo': {'hasNextPage': end < total,
+                         'endCursor': str(end)},
+            'nodes': nodes}}}})
+
+    # GitLab
+
+    def gitlabProjects(self):
+        self._reply(200, [])
+
+    def gitlabVersion(self):
+        self._reply(200, {'version': "16.0.0", 'revision': "fake"})
+
+    def gitlabGroup(self, name):
+        group = self.fake.groups.get(name.lower())
+        if group is None:
+            return self._reply(404, {'message': "404 Group Not Found"})
+        self._reply(200, group)
+
+    def gitlabCreateGroup(self):
+        parent = self.data.get('parent_id')
+        path = self.data['path']
+        if parent:
+            parents = [g for g in self.fake.groups.values() if str(g['id']) == str(parent)]
+            path = f"{parents[0]['full_path']}/{path}"
+        if path.lower() in self.fake.groups:
+            return self._reply(400, {'message': "Failed to save group"})
+        group = {'id': len(self.fake.groups) + 1, 'name': self.data['name'],
+                 'path': self.data['path'], 'full_path': path,
+                 'parent_id': parent and int(parent)}
+        self.fake.groups[path.lower()] = group
+        self._reply(201, group)
+
+    def gitlabGroupProjects(self, name):
+        if name.lower() not in self.fake.groups:
+            return self._reply(404, {'message': "404 Group Not Found"})
+        subgroups = self.query.get('include_subgroups') == "true"
+        prefix = name.lower() + "/"
+        projects = [p for p in self.fake.projects.values()
+                    if p['namespace']['full_path'].lower() == name.lower() or
+                    (subgroups and p['namespace']['full_path'].lower().startswith(prefix))]
+        self._paginate(projects, f"/api/v4/groups/{urllib.parse.quote_plus(name)}/projects")
+
+    def _project(self, ref):
+        if ref.isdigit():
+            return self.fake.projects.get(int(ref))
+        for p in self.fake.projects.values():
+            if p['path_with_namespace'].lower() == ref.lower():
+                return p
+        return None
+
+    def gitlabProject(self, ref):
+        p = self._project(ref)
+        if p is None:
+            return self._reply(404, {'message': "404 Project Not Found"})
+        self._updateImport(p)
+        self._reply(200, p)
+
+    def gitlabCreateProject(self):
+        groups = [g for g in self.fake.groups.values()
+                  if str(g['id']) == str(self.data.get('namespace_id'))]
+        if not groups:
+            return self._reply(400, {'message': {'namespace': ["is not valid"]}})
+        if self._project(f"{groups[0]['full_path']}/{self.data['name']}"):
+            return self._reply(400, {'message': {'name': ["has already been taken"]}})
+        p = self.fake._addProject(groups[0]['full_path'], self.data['name'], "none")
+        self._reply(201, p)
+
+    def gitlabImportGithub(self):
+        namespace = self.data['target_namespace']
+        repos = [r for r in self.fake.repos if str(r['id']) == str(self.data['repo_id'])]
+        if not repos or namespace.lower() not in self.fake.groups:
+            return self._reply(422, {'message': "Invalid import"})
+        if self._project(f"{namespace}/{repos[0]['name']}"):
+            return self._reply(422, {'message': "Project already exists"})
+        p = self.fake._addProject(namespace, repos[0]['name'], "scheduled")
+        p['import_url'] = repos[0]['clone_url']
+        self.fake.imports[p['id']] = time.time()
+        self._reply(201, {'id': p['id'], 'name': p['name'],
+                          'full_path': "/" + p['full_path'],
+                          'full_name': p['full_path'],
+                          'import_status': p['import_status']})
+
+    def _updateImport(self, p):
+        started = self.fake.imports.get(p['id'])
+        if started is not None:
+            if time.time() - started >= self.fake.import_duration:
+                p['import_status'] = "finished"
+                del self.fake.imports[p['id']]
+            else:
+                p['import_status'] = "started"
+
+    def gitlabImportStatus(self, ref):
+        p = self._project(ref)
+        if p is None:
+            return self._reply(404, {'message': "404 Project Not Found"})
+        self._updateImport(p)
+        self._reply(200, {'id': p['id'], 'import_status': p['import_status']})
+
+    def gitlabGetMirror(self, ref):
+        p = self._project(ref)
+        if p is None or p['id'] not in self.fake.mirrors:
+            return self._reply(400, {'message': "Pull mirror not configured"})
+        self._reply(200, {'id': p['id'], 'url': self.fake.mirrors[p['id']],
+                          'enabled': True, 'update_status': "finished"})
+
+    def gitlabSetMirror(self, ref):
+        p = self._project(ref)
+        if p is None:
+            return self._reply(404, {'message': "404 Project Not Found"})
+        self.fake.mirrors[p['id']] = self.data['url']
+        p['mirror'] = True
+        p['import_url'] = self.data['url']
+        self._reply(200, {'id': p['id'], 'url': self.data['url'], 'enabled': True})
+
+    def gitlabStartMirror(self, ref):
+        p = self._project(ref)
+        if p is None or p['id'] not in self.fake.mirrors:
+            return self._reply(400, {'message': "Pull mirror not configured"})
+        self._reply(200, {})
+
+
+_ROUTES = [
+    ("GET", r"/github/", _Handler.githubRoot),
+    ("GET", r"/github/user", _Handler.githubUser),
+    ("GET", r"/github/(orgs|users)/([^/]+)/repos", _Handler.githubRepos),
+    ("POST", r"/github/graphql", _Handler.githubGraphql),
+    ("GET", r"/api/v4/projects", _Handler.gitlabProjects),
+    ("GET", r"/api/v4/version", _Handler.gitlabVersion),
+    ("POST", r"/api/v4/groups", _Handler.gitlabCreateGroup),
+    ("GET", r"/api/v4/groups/([^/]+)", _Handler.gitlabGroup),
+    ("GET", r"/api/v4/groups/([^/]+)/projects", _Handler.gitlabGroupProjects),
+    ("POST", r"/api/v4/projects", _Handler.gitlabCreateProject),
+    ("GET", r"/api/v4/projects/([^/]+)", _Handler.gitlabProject),
+    ("POST", r"/api/v4/import/github", _Handler.gitlabImportGithub),
+    ("GET", r"/api/v4/projects/([^/]+)/import", _Handler.gitlabImportStatus),
+    ("GET", r"/api/v4/projects/([^/]+)/mirror/pull", _Handler.gitlabGetMirror),
+    ("PUT", r"/api/v4/projects/([^/]+)/mirror/pull", _Handler.gitlabSetMirror),
+    ("POST", r"/api/v4/projects/([^/]+)/mirror/pull", _Handler.gitlabStartMirror),
+]
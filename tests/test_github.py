@@ -1,6 +1,9 @@
+import json
 import github
+import transport
 import pytest
 
+from . import fakeapi
 from . import read_config
 
 config = read_config.getConfig()
@@ -42,3 +45,121 @@ def test_getRepo_badowner():
     with pytest.raises(github.github.OwnerTypeError) as errinfo:
         repos = gh.getRepos(gh_test_group, "bad")
     assert str(errinfo.value) == ": Unknown GitHub owner type: 'bad'"
+
+
+def test_response_cache(tmp_path):
+    """A stored page is saved to disk, produces conditional headers
+    when reloaded, and is served from the cache after a 304."""
+    class Response:
+        headers = {'ETag': 'W/"abc"'}
+
+    path = str(tmp_path / "gh_cache.json")
+    url = "https://api.github.com/orgs/test/repos"
+    cache = github.ResponseCache(path)
+    assert cache.conditionalHeaders(url) == {}
+    cache.store(url, Response(), [{'id': 1}], {})
+    cache.save()
+
+    cache = github.ResponseCache(path)
+    assert cache.conditionalHeaders(url) == {'If-None-Match': 'W/"abc"'}
+    assert cache.lookup(url) == ([{'id': 1}], {})
+    assert cache.hits == 1
+    assert cache.misses == 0
+
+
+class _GraphQLTransport:
+    """Transport answering the GraphQL repository listing with two
+    pages of one repository each."""
+
+    class Response:
+        status_code = 200
+        headers = {}
+        links = {}
+
+        def __init__(self, data=None):
+            self.content = json.dumps(data or {}).encode()
+
+    def get(self, url, **kwargs):
+        return self.Response()
+
+    def post(self, url, **kwargs):
+        after = kwargs['json']['variables']['after']
+        n = 2 if after else 1
+        node = {'databaseId': n, 'name': f"repo{n}",
+                'nameWithOwner': f"org/repo{n}",
+                'sshUrl': f"git@github.com:org/repo{n}.git",
+                'url': f"https://github.com/org/repo{n}",
+                'hasWikiEnabled': n == 1, 'pushedAt': None,
+                'updatedAt': None, 'isArchived': False, 'isFork': n == 2}
+        return self.Response({'data': {'owner': {'repositories': {
+            'pageInfo': {'hasNextPage': n == 1, 'endCursor': 'c1'},
+            'nodes': [node]}}}})
+
+
+def test_getRepos_graphql():
+    """The GraphQL listing follows the cursor and returns the same
+    GithubRepo objects as the REST listing."""
+    gh = github.Github("token", transport=_GraphQLTransport(), listing='graphql')
+    repos = gh.getRepos("org", "orgs")
+    assert [r.id for r in repos] == [1, 2]
+    assert repos[0].clone_url == "https://github.com/org/repo1.git"
+    assert repos[0].wiki_url == "https://github.com/org/repo1.wiki.git"
+    assert repos[1].fork is True
+
+
+def test_graphql_endpoint():
+    """The GraphQL endpoint is derived from the REST API URL, on
+    github.com and on GitHub Enterprise."""
+    class RecordingTransport(_GraphQLTransport):
+        def post(self, url, **kwargs):
+            self.url = url
+            return super().post(url, **kwargs)
+
+    for (api_url, expected) in ((None, "https://api.github.com/graphql"),
+                                ("https://ghe.example.com/api/v3",
+                                 "https://ghe.example.com/api/graphql")):
+        t = RecordingTransport()
+        gh = github.Github("token", transport=t, listing='graphql', api_url=api_url)
+        gh.getRepos("org", "orgs")
+        assert t.url == expected
+
+
+def test_lazy_validation(tmp_path):
+    """The token is checked once, on the first request, and not at all
+    while a recent check is cached."""
+    class CountingTransport(_GraphQLTransport):
+        gets = 0
+
+        def get(self, url, **kwargs):
+            self.gets += 1
+            return super().get(url, **kwargs)
+
+    validation = transport.ValidationCache(str(tmp_path / "auth.json"))
+    t = CountingTransport()
+    gh = github.Github("token", transport=t, listing='graphql', validation=validation)
+    assert t.gets == 0
+    gh.getRepos("org", "orgs")
+    gh.getRepos("org", "orgs")
+    assert t.gets == 1
+
+    t = CountingTransport()
+    gh = github.Github("token", transport=t, listing='graphql', validation=validation)
+    gh.getRepos("org", "orgs")
+    assert t.gets == 0
+
+
+@pytest.mark.parametrize("listing", ["rest", "graphql"])
+def test_iterRepos_query_filters(listing):
+    """Forks and archived repositories are left out by the listing
+    query, which is in push order and stops at pushed_since."""
+    with fakeapi.FakeApi(repos=60) as api:
+        gh = github.Github("token", api_url=api.github_url, listing=listing)
+        repos = list(gh.iterRepos(api.org, "orgs", per_page=10, forks=False,
+                                  archived=False, pushed_since="2024-06-01T00:00:00Z"))
+        pushed = [r.pushed_at for r in repos]
+        assert pushed == sorted(pushed, reverse=True)
+        assert min(pushed) >= "2024-06-01T00:00:00Z"
+        assert not any(r.fork or r.archived for r in repos)
+        expected = [r for r in api.repos if not r['fork'] and not r['archived'] and
+                    r['pushed_at'] >= "2024-06-01T00:00:00Z"]
+        assert len(repos) == len(expected)
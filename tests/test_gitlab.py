@@ -1,5 +1,7 @@
 import gitlab
+import transport
 
+from . import fakeapi
 from . import read_config
 
 config = read_config.getConfig()
@@ -122,3 +124,57 @@ def test_import_status_project():
     project = gl.findProject(gl_test_project, gl_test_group)
     status = gl.importStatus(project)
     assert status is not None
+
+
+def test_provision(tmp_path):
+    """Projects are created with their (nested) groups, each group is
+    resolved once, and once across runs with a namespace cache."""
+    namespaces = gitlab.NamespaceCache(str(tmp_path / "namespaces.json"))
+    with fakeapi.FakeApi(repos=0) as api:
+        gl = gitlab.Gitlab(api.url, "gitlab-token", transport=transport.Transport(),
+                           namespaces=namespaces)
+        wanted = [(f"{api.group}/models/{sub}", f"repo-{n}")
+                  for sub in ("a", "b") for n in range(5)]
+        projects = gl.provision(wanted)
+        assert all(p.id != -1 for p in projects.values())
+        assert sorted(p['path_with_namespace'] for p in api.projects.values()) == \
+            sorted("/".join(item) for item in wanted)
+        assert api.requests["POST /api/v4/groups"] == 3
+        assert api.requests["GET /api/v4/groups/([^/]+)"] == 4
+
+        api.requests.clear()
+        gl = gitlab.Gitlab(api.url, "gitlab-token", transport=transport.Transport(),
+                           namespaces=gitlab.NamespaceCache(str(tmp_path / "namespaces.json")))
+        assert gl.createProject("new", f"{api.group}/models/a").id != -1
+        assert api.requests["GET /api/v4/groups/([^/]+)"] == 0
+        assert gl.resolveNamespace("missing").id == -1
+        assert gl.createGroup("missing").id != -1
+
+        # A project name already taken is not retried, a stale group id
+        # is resolved again
+        api.requests.clear()
+        assert gl.createProject("new", f"{api.group}/models/a").id == -1
+        assert api.requests["POST /api/v4/projects"] == 1
+        assert api.requests["GET /api/v4/groups/([^/]+)"] == 0
+        (_, name, path) = namespaces.get(gl._api_url, f"{api.group}/models/b")
+        namespaces.record(gl._api_url, f"{api.group}/models/b", 99999, name, path)
+        gl = gitlab.Gitlab(api.url, "gitlab-token", transport=transport.Transport(),
+                           namespaces=namespaces)
+        api.requests.clear()
+        assert gl.createProject("newer", f"{api.group}/models/b").id != -1
+        assert api.requests["POST /api/v4/projects"] == 2
+
+
+def test_index_subgroups():
+    """Projects missing from an indexed group or subgroup are known not
+    to exist without a request."""
+    with fakeapi.FakeApi(repos=0) as api:
+        api.addProject(api.group, "top")
+        api.addProject(f"{api.group}/sub", "nested")
+        gl = gitlab.Gitlab(api.url, "gitlab-token", transport=transport.Transport())
+        assert gl.indexGroupProjects(api.group, include_subgroups=True) == 2
+        api.requests.clear()
+        assert gl.findProject("nested", f"{api.group}/sub").id != -1
+        assert gl.findProject("missing", f"{api.group}/sub").id == -1
+        assert gl.findProject("missing", api.group).id == -1
+        assert sum(api.requests.values()) == 0
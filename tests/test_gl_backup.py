@@ -0,0 +1,64 @@
+"""Tests of gl_backup with a stub backup command."""
+import os
+import subprocess
+import sys
+
+GL_BACKUP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gl_backup")
+
+# Prints its arguments and writes a new archive, named after its first
+# argument, to the backup directory
+STUB = """import sys
+print("Dumping database ... done")
+print(" ".join(sys.argv[2:]), flush=True)
+with open(f"{sys.argv[1]}/{sys.argv[2]}_gitlab_backup.tar", "w") as f:
+    f.write("x" * 1024)
+sys.exit(int(sys.argv[3]))
+"""
+
+
+def _backup(tmp_path, name, status=0, args=()):
+    backups = tmp_path / "backups"
+    backups.mkdir(exist_ok=True)
+    stub = tmp_path / "stub.py"
+    stub.write_text(STUB)
+    log = tmp_path / "gl_backup.log"
+    r = subprocess.run([sys.executable, GL_BACKUP, "--gitlab-dir", str(tmp_path),
+                        "--backup-dir", str(backups), "--log", str(log),
+                        "--command", f"{sys.executable} {stub} {backups} {name} {status}",
+                        *args], capture_output=True, text=True)
+    return (r.returncode, r.stdout, log.read_text())
+
+
+def test_backup(tmp_path):
+    """The command output is logged line by line, the options are passed
+    to the command and the archive is reported."""
+    (status, out, log) = _backup(tmp_path, "1700000000_2024_01_01_16.0.0",
+                                 args=["--skip", "uploads,artifacts", "--concurrency", "4",
+                                       "--compress", "zstd"])
+    assert status == 0
+    assert "[INFO] Dumping database ... done" in log
+    assert "SKIP=uploads,artifacts" in log
+    assert "GITLAB_BACKUP_MAX_CONCURRENCY=4" in log
+    assert "COMPRESS_CMD=zstd" in log
+    assert "archive=1700000000_2024_01_01_16.0.0_gitlab_backup.tar bytes=1024" in out
+
+
+def test_backup_incremental_rotate(tmp_path):
+    """An incremental backup builds on the newest archive, and only the
+    newest archives are kept."""
+    for (n, name) in enumerate(("1", "2", "3")):
+        (status, _, log) = _backup(tmp_path, name, args=["--incremental", "--keep", "2"])
+        assert status == 0
+        os.utime(tmp_path / "backups" / f"{name}_gitlab_backup.tar", (n, n))
+    assert "INCREMENTAL=yes PREVIOUS_BACKUP=2" in log
+    assert sorted(os.listdir(tmp_path / "backups")) == ["2_gitlab_backup.tar",
+                                                        "3_gitlab_backup.tar"]
+
+
+def test_backup_failed(tmp_path):
+    """A failed backup returns its status and removes no archive."""
+    _backup(tmp_path, "1")
+    (status, out, _) = _backup(tmp_path, "2", status=3, args=["--keep", "1"])
+    assert status == 3
+    assert "status=3" in out
+    assert len(os.listdir(tmp_path / "backups")) == 2
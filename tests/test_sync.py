@@ -0,0 +1,243 @@
+"""End to end tests of gh_sync against the simulated API server."""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from . import fakeapi
+from .bench_sync import GH_SYNC, runSync, writeConfig
+from .test_ghsync import _deliver
+
+
+def test_sync(tmp_path):
+    """Every repository is imported and configured to pull mirror, and
+    a second run finds nothing left to do."""
+    with fakeapi.FakeApi(repos=12, import_duration=0.2) as api:
+        (status, _, _) = runSync(api, str(tmp_path), ["--workers", "4"])
+        assert status == 0
+        assert len(api.projects) == 12
+        assert sorted(api.mirrors.values()) == sorted(r['clone_url'] for r in api.repos)
+
+        api.requests.clear()
+        (status, _, _) = runSync(api, str(tmp_path))
+        assert status == 0
+        assert api.requests["POST /api/v4/import/github"] == 0
+        assert api.requests["PUT /api/v4/projects/([^/]+)/mirror/pull"] == 0
+
+
+def test_sync_existing(tmp_path):
+    """Projects that already exist are not imported again, only
+    configured to pull mirror."""
+    with fakeapi.FakeApi(repos=5) as api:
+        for repo in api.repos:
+            api.addProject(api.group, repo['name'])
+        (status, _, _) = runSync(api, str(tmp_path), ["--workers", "2"])
+        assert status == 0
+        assert api.requests["POST /api/v4/import/github"] == 0
+        assert api.requests["GET /api/v4/projects/([^/]+)"] == 0
+        assert len(api.mirrors) == 5
+
+
+def test_sync_metrics(tmp_path):
+    """A run writes its request counts, stage timings and results to
+    the metrics textfile."""
+    metrics_file = str(tmp_path / "gh_sync.prom")
+    with fakeapi.FakeApi(repos=3) as api:
+        (status, _, _) = runSync(api, str(tmp_path), ["--metrics-file", metrics_file])
+        assert status == 0
+    with open(metrics_file) as f:
+        text = f.read()
+    assert 'gh_sync_repos_total{result="mirrored"} 3' in text
+    assert 'endpoint="/api/v4/import/github"' in text
+    assert 'gh_sync_stage_duration_seconds_count{stage="list"} 1' in text
+    assert 'gh_sync_stage_duration_seconds_count{stage="mirror"} 3' in text
+
+
+def test_sync_trace(tmp_path):
+    """A traced run records every repository, its stages and its API
+    requests."""
+    trace_file = str(tmp_path / "trace.json")
+    with fakeapi.FakeApi(repos=3, import_duration=0.2) as api:
+        (status, _, _) = runSync(api, str(tmp_path), ["--workers", "2", "--trace", trace_file])
+        assert status == 0
+    with open(trace_file) as f:
+        events = json.load(f)['traceEvents']
+    repos = {e['args']['repo'] for e in events if e['name'] == "repo"}
+    assert len(repos) == 3
+    names = {e['name'] for e in events}
+    assert {"list", "find", "import", "import_wait", "import_poll", "mirror",
+            "POST /api/v4/import/github"} <= names
+    assert all('repo' in e['args'] for e in events if e['name'] == "POST /api/v4/import/github")
+
+
+def test_sync_filter(tmp_path):
+    """Repositories rejected by the configured rules are not mirrored."""
+    with fakeapi.FakeApi(repos=25) as api:
+        extra = "excludeRepos: repo-0000[1-4]\nskipForks: true\n"
+        (status, _, _) = runSync(api, str(tmp_path), ["--workers", "4"], extra)
+        assert status == 0
+        mirrored = sorted(p['path'] for p in api.projects.values())
+        assert len(mirrored) == 20
+        assert "repo-00001" not in mirrored and "repo-00020" not in mirrored
+    with open(tmp_path / "gh_sync.log") as f:
+        assert "Repositories filtered out: 4 excluded" in f.read()
+
+
+def test_sync_shards(tmp_path):
+    """Two shards together mirror every repository once."""
+    with fakeapi.FakeApi(repos=12) as api:
+        for i in range(2):
+            (status, _, _) = runSync(api, str(tmp_path), ["--shard", f"{i}/2"])
+            assert status == 0
+        assert api.requests["POST /api/v4/import/github"] == 12
+        assert len(api.mirrors) == 12
+
+
+def _startDaemon(api, workdir):
+    """Start gh_sync --daemon against api, and return the process and
+    the port of its webhook receiver once it listens."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    writeConfig(api, workdir)
+    proc = subprocess.Popen([sys.executable, GH_SYNC, "--daemon", "--webhook-port", str(port)],
+                            cwd=workdir, stdout=subprocess.DEVNULL,
+                            env=dict(os.environ, GHSYNC_WEBHOOK_SECRET="s3cret"))
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return (proc, port)
+
+
+def _waitFor(condition):
+    for _ in range(100):
+        if condition():
+            return
+        time.sleep(0.1)
+
+
+def test_sync_daemon(tmp_path):
+    """In daemon mode a push starts a pull mirror update of an existing
+    project, or configures its pull mirror if it has none and then
+    starts it, and a new repository is imported."""
+    with fakeapi.FakeApi(repos=3) as api:
+        existing = api.repos[0]
+        project = api.addProject(api.group, existing['name'])
+        api.mirrors[project['id']] = existing['clone_url']
+        project['mirror'] = True
+        unmirrored = api.repos[2]
+        api.addProject(api.group, unmirrored['name'])
+        (proc, port) = _startDaemon(api, str(tmp_path))
+        try:
+            assert _deliver(port, "push", {'repository': existing}) == 202
+            assert _deliver(port, "repository", {'action': "created", 'repository': api.repos[1]}) == 202
+            assert _deliver(port, "push", {'repository': dict(unmirrored, pushed_at=1717200000)}) == 202
+            _waitFor(lambda: api.requests["POST /api/v4/projects/([^/]+)/mirror/pull"] == 2
+                     and len(api.mirrors) == 3)
+            assert api.requests["POST /api/v4/projects/([^/]+)/mirror/pull"] == 2
+            assert api.requests["POST /api/v4/import/github"] == 1
+            assert len(api.mirrors) == 3
+        finally:
+            proc.terminate()
+            assert proc.wait(30) == 0
+
+
+def test_sync_daemon_create_then_push(tmp_path):
+    """A push to a repository mirrored earlier by the daemon starts a
+    pull, although the project was not mirrored when it started."""
+    with fakeapi.FakeApi(repos=1) as api:
+        (proc, port) = _startDaemon(api, str(tmp_path))
+        try:
+            repo = api.repos[0]
+            assert _deliver(port, "repository", {'action': "created", 'repository': repo}) == 202
+            _waitFor(lambda: len(api.mirrors) == 1)
+            assert len(api.mirrors) == 1
+            assert _deliver(port, "push", {'repository': repo}) == 202
+            _waitFor(lambda: api.requests["POST /api/v4/projects/([^/]+)/mirror/pull"] == 1)
+            assert api.requests["POST /api/v4/projects/([^/]+)/mirror/pull"] == 1
+        finally:
+            proc.terminate()
+            assert proc.wait(30) == 0
+
+
+def test_sync_plan_apply(tmp_path):
+    """A plan lists what a sync would do without doing it, and applying
+    it within a budget leaves the rest for the next run."""
+    plan_file = str(tmp_path / "plan.json")
+    with fakeapi.FakeApi(repos=6) as api:
+        api.addProject(api.group, api.repos[0]['name'])
+        (status, _, _) = runSync(api, str(tmp_path), ["--plan", plan_file])
+        assert status == 0
+        assert api.requests["POST /api/v4/import/github"] == 0
+        with open(plan_file) as f:
+            actions = json.load(f)['actions']
+        assert sorted(a['action'] for a in actions) == ["import"] * 5 + ["set-mirror"]
+
+        # Each import is estimated at 10 requests, on top of validating
+        # the tokens and listing both sides
+        (status, _, _) = runSync(api, str(tmp_path), ["--apply", plan_file, "--budget", "30"])
+        assert status == 0
+        assert 0 < api.requests["POST /api/v4/import/github"] < 5
+        assert api.requests["PUT /api/v4/projects/([^/]+)/mirror/pull"] < 6
+
+        (status, _, _) = runSync(api, str(tmp_path), ["--apply", plan_file])
+        assert status == 0
+        assert len(api.mirrors) == 6
+        with open(plan_file) as f:
+            assert json.load(f)['actions'] == []
+
+
+def test_sync_apply_new_namespace(tmp_path):
+    """Applying a plan creates the missing GitLab groups of the imports
+    first, each once."""
+    plan_file = str(tmp_path / "plan.json")
+    with fakeapi.FakeApi(repos=4) as api:
+        extra = f"[repo-*]\ngitLabNSpace: {api.group}/mirrors/new\n"
+        (status, _, _) = runSync(api, str(tmp_path), ["--plan", plan_file], extra)
+        assert status == 0
+        with open(plan_file) as f:
+            reads = sum(a['reads'] for a in json.load(f)['actions'])
+        api.requests.clear()
+        (status, _, _) = runSync(api, str(tmp_path), ["--apply", plan_file, "--workers", "4"],
+                                 extra)
+        assert status == 0
+        assert api.requests["POST /api/v4/groups"] == 2
+        # Each import looks the project up once, and reads it back once
+        # created, within the reads planned for it
+        assert api.requests["GET /api/v4/projects/([^/]+)"] == 2 * 4
+        assert (api.requests["GET /api/v4/projects/([^/]+)"] +
+                api.requests["GET /api/v4/projects/([^/]+)/mirror/pull"]) <= reads
+        assert len(api.mirrors) == 4
+        assert all(p['namespace']['full_path'] == f"{api.group}/mirrors/new"
+                   for p in api.projects.values())
+
+
+def test_sync_resume(tmp_path):
+    """A run after a crash waits for the imports the crashed run had
+    submitted, skips what it had finished, and does the rest."""
+    with fakeapi.FakeApi(repos=4, import_duration=0.5) as api:
+        (running, done) = api.repos[:2]
+        project = api.addProject(api.group, running['name'], import_status="started")
+        api.imports[project['id']] = time.time()
+        with open(tmp_path / "gh_sync.shard-0-of-1.journal", "w") as f:
+            f.write(json.dumps({'id': running['id'], 'name': running['full_name'],
+                                'stage': "import-submitted",
+                                'gitlab': f"{api.group}/{running['name']}",
+                                'project': {'id': project['id'], 'name': project['name'],
+                                            'path': project['path_with_namespace']},
+                                'repo': {f: running[f] for f in ('id', 'name', 'full_name',
+                                                                 'ssh_url', 'clone_url',
+                                                                 'has_wiki')}}) + "\n")
+            f.write(json.dumps({'id': done['id'], 'name': done['full_name'],
+                                'stage': "mirror-configured"}) + "\n")
+        (status, _, _) = runSync(api, str(tmp_path))
+        assert status == 0
+        assert api.requests["POST /api/v4/import/github"] == 2
+        assert project['id'] in api.mirrors
+        assert len(api.mirrors) == 3
+        assert os.path.getsize(tmp_path / "gh_sync.shard-0-of-1.journal") == 0
@@ -0,0 +1,150 @@
+import gzip
+import http.server
+import threading
+import time
+
+import pytest
+
+import transport
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/limited" and not self.server.limited:
+            self.server.limited = True
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f"{self.client_address[1]}".encode()
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.limited = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_per_host(server):
+    """Requests to the same host share one session, and the session
+    is reused for later requests."""
+    t = transport.Transport()
+    assert t.session(server + "/a") is t.session(server + "/b")
+    assert t.session(server) is not t.session("http://localhost:1/")
+
+
+def test_keep_alive(server):
+    """Consecutive requests reuse the same connection, seen by the
+    server as the same client port.  Responses are gzip decoded."""
+    t = transport.Transport()
+    ports = {t.get(server + "/x").text for _ in range(3)}
+    assert len(ports) == 1
+    t.close()
+
+
+def test_default_transport():
+    """The process-wide transport can be replaced."""
+    t = transport.Transport(pool_size=2, timeout=5)
+    transport.setTransport(t)
+    assert transport.getTransport() is t
+    transport.setTransport(None)
+    assert isinstance(transport.getTransport(), transport.Transport)
+
+
+def test_rate_limit_retry(server):
+    """A 429 response is retried after Retry-After."""
+    limiter = transport.RateLimiter()
+    t = transport.Transport(limiter=limiter)
+    r = t.get(server + "/limited")
+    assert r.status_code == 200
+    [line] = limiter.summary()
+    assert "2 requests" in line
+    assert "1 rate limited" in line
+
+
+def test_rate_limit_pacing():
+    """Below the pacing threshold, requests are spaced over the time
+    left until the reset, and none are delayed above it."""
+    class Response:
+        status_code = 200
+        def __init__(self, remaining):
+            self.headers = {"X-RateLimit-Limit": "100",
+                            "X-RateLimit-Remaining": str(remaining),
+                            "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+
+    limiter = transport.RateLimiter(pace_below=0.25, max_wait=0)
+    assert limiter.update("api.github.com", Response(50)) is None
+    limiter.wait("api.github.com")
+    assert limiter._hosts["api.github.com"]["next_slot"] == 0.0
+    limiter.update("api.github.com", Response(10))
+    limiter.wait("api.github.com")
+    assert limiter._hosts["api.github.com"]["next_slot"] > time.time() + 300
+
+
+def _fetchPages(count, last=True):
+    """Return a fetch function for a listing of count pages."""
+    base = "https://api.example.com/items?per_page=100&page="
+    fetched = []
+
+    def fetch(url):
+        n = int(url.rsplit("=", 1)[1])
+        fetched.append(n)
+        links = {}
+        if n < count:
+            links["next"] = base + str(n + 1)
+            if last:
+                links["last"] = base + str(count)
+        return ([n], links)
+    return (fetch, base + "1", fetched)
+
+
+def test_iter_pages_prefetch():
+    """With a last link, all pages are fetched and yielded in order."""
+    (fetch, url, fetched) = _fetchPages(20)
+    pages = list(transport.iterPages(fetch, url, max_workers=4))
+    assert pages == [[n] for n in range(1, 21)]
+    assert sorted(fetched) == list(range(1, 21))
+
+
+def test_iter_pages_next_only():
+    """Without a last link, the next links are followed."""
+    (fetch, url, fetched) = _fetchPages(5, last=False)
+    pages = list(transport.iterPages(fetch, url, max_workers=4))
+    assert pages == [[n] for n in range(1, 6)]
+    assert fetched == [1, 2, 3, 4, 5]
+
+
+def test_validation_cache(tmp_path):
+    """A validation is remembered across instances for ttl seconds,
+    per URL and token, without writing the token."""
+    path = str(tmp_path / "auth.json")
+    cache = transport.ValidationCache(path, ttl=60)
+    assert not cache.isValid("https://gl.example.com/api/v4", "secret")
+    cache.record("https://gl.example.com/api/v4", "secret")
+
+    cache = transport.ValidationCache(path, ttl=60)
+    assert cache.isValid("https://gl.example.com/api/v4", "secret")
+    assert not cache.isValid("https://gl.example.com/api/v4", "other")
+    with open(path) as f:
+        assert "secret" not in f.read()
+    assert not transport.ValidationCache(path, ttl=0).isValid("https://gl.example.com/api/v4", "secret")
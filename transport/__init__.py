@@ -0,0 +1,5 @@
+from .transport import Transport, getTransport, setTransport
+from .ratelimit import RateLimiter
+from .pagination import iterPages, linkUrls
+from .validation import ValidationCache
+from .jsonfile import loadJson, saveJson
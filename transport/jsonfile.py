@@ -0,0 +1,28 @@
+import json
+import os
+
+def loadJson(path, default=None):
+    """Return the JSON document in the file path, or default (an empty
+    dict when None) if the file is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+def saveJson(path, data):
+    """Write data as JSON to the file path, replacing it atomically, so
+    concurrent runs and readers never see a partial file.  Raises
+    OSError if the file cannot be written."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,68 @@
+import collections
+import concurrent.futures
+import itertools
+import urllib.parse
+
+def iterPages(fetch, url, max_workers=4):
+    """Yield the pages of a paginated API listing, in order.
+
+    When the first response has a "last" link, the URLs of the remaining
+    pages are worked out from its page parameter and fetched
+    concurrently, with at most max_workers requests in flight.
+    Otherwise the "next" links are followed one page at a time.
+
+    Arguments
+
+    fetch: Function taking a page URL and returning (page, links), where
+        links maps a link relation ("next", "last", ...) to its URL.
+    url: URL of the first page.
+    max_workers: Maximum number of pages fetched at once.
+    """
+    (page, links) = fetch(url)
+    yield page
+    urls = _pageUrls(links.get("next"), links.get("last"))
+    if urls is None or max_workers < 2:
+        url = links.get("next")
+        while url:
+            (page, links) = fetch(url)
+            yield page
+            url = links.get("next")
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Keep a bounded window of requests in flight ahead of the
+        # page being yielded
+        urls = iter(urls)
+        pending = collections.deque(pool.submit(fetch, u)
+                                    for u in itertools.islice(urls, 2 * max_workers))
+        while pending:
+            (page, links) = pending.popleft().result()
+            u = next(urls, None)
+            if u is not None:
+                pending.append(pool.submit(fetch, u))
+            yield page
+
+
+def linkUrls(response):
+    """Return the Link header of a response as {relation: URL}."""
+    return {rel: link["url"] for (rel, link) in response.links.items()}
+
+
+def _pageUrls(next_url, last_url):
+    """Return the URLs from next_url to last_url, built by changing the
+    page query parameter, or None if they cannot be worked out."""
+    if not next_url or not last_url:
+        return None
+    next_parts = urllib.parse.urlsplit(next_url)
+    next_query = urllib.parse.parse_qsl(next_parts.query)
+    try:
+        first = int(dict(next_query)["page"])
+        last = int(dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(last_url).query))["page"])
+    except (KeyError, ValueError):
+        return None
+    urls = []
+    for n in range(first, last + 1):
+        query = [(k, str(n) if k == "page" else v) for (k, v) in next_query]
+        urls.append(urllib.parse.urlunsplit(next_parts._replace(
+            query=urllib.parse.urlencode(query))))
+    return urls
@@ -0,0 +1,128 @@
+import email.utils
+import logging
+import threading
+import time
+
+class RateLimiter:
+    """Rate-limit-aware scheduler for API requests.
+
+    The limiter reads the rate limit headers of every response, GitHub's
+    X-RateLimit-* and GitLab's RateLimit-* and Retry-After, and keeps
+    the remaining budget per host.  Once less than pace_below of the
+    budget is left, requests are spaced so the rest lasts until the
+    limit resets.  A 429, or a 403 with no budget left, is retried after
+    Retry-After or the reset time.
+    """
+
+    def __init__(self, pace_below=0.25, max_retries=3, max_wait=900):
+        """Create a new limiter.
+
+        Arguments
+
+        pace_below: Fraction of the budget below which requests are
+            paced over the time left until the reset.
+        max_retries: Number of times a rate limited request is retried.
+        max_wait: Longest time in seconds to wait for a single retry.
+        """
+        self._pace_below = pace_below
+        self.max_retries = max_retries
+        self._max_wait = max_wait
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        h = self._hosts.get(host)
+        if h is None:
+            h = self._hosts[host] = {'limit': None, 'remaining': None, 'reset': None,
+                                     'next_slot': 0.0, 'used': 0, 'waited': 0.0,
+                                     'retries': 0}
+        return h
+
+    def wait(self, host):
+        """Block until a request to host may be sent."""
+        with self._lock:
+            h = self._host(host)
+            h['used'] += 1
+            delay = 0.0
+            now = time.time()
+            if h['remaining'] is not None and h['reset'] is not None and h['reset'] > now:
+                if h['remaining'] <= 0:
+                    delay = h['reset'] - now
+                elif h['limit'] and h['remaining'] < h['limit'] * self._pace_below:
+                    interval = (h['reset'] - now) / h['remaining']
+                    slot = max(now, h['next_slot'])
+                    h['next_slot'] = slot + interval
+                    delay = slot - now
+            delay = min(delay, self._max_wait)
+            h['waited'] += delay
+        if delay > 0:
+            time.sleep(delay)
+
+    def update(self, host, response):
+        """Record the rate limit state from a response to host.
+
+        Returns the number of seconds to wait before retrying the
+        request, or None if the response was not rate limited.
+        """
+        headers = response.headers
+        remaining = _header(headers, 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+        limit = _header(headers, 'X-RateLimit-Limit', 'RateLimit-Limit')
+        reset = _header(headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+        retry_after = _retryAfter(headers.get('Retry-After'))
+        with self._lock:
+            h = self._host(host)
+            if remaining is not None:
+                h['remaining'] = remaining
+            if limit is not None:
+                h['limit'] = limit
+            if reset is not None:
+                h['reset'] = reset
+            limited = (response.status_code == 429 or
+                       (response.status_code == 403 and
+                        (retry_after is not None or h['remaining'] == 0)))
+            if not limited:
+                return None
+            h['retries'] += 1
+            if retry_after is None:
+                retry_after = max(0.0, (h['reset'] or time.time()) - time.time()) + 1
+            delay = min(retry_after, self._max_wait)
+            h['waited'] += delay
+        logging.warning(f"Rate limited by {host} ({response.status_code}), "
+                        f"retrying in {delay:.0f}s")
+        return delay
+
+    def summary(self):
+        """Return one line per host with the budget used."""
+        lines = []
+        with self._lock:
+            for host, h in sorted(self._hosts.items()):
+                budget = (f"{h['remaining']}/{h['limit']} remaining"
+                          if h['remaining'] is not None else "no rate limit reported")
+                lines.append(f"{host}: {h['used']} requests, {budget}, "
+                             f"{h['retries']} rate limited, {h['waited']:.1f}s waited")
+        return lines
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                pass
+    return None
+
+
+def _retryAfter(value):
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,125 @@
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class Transport:
+    """Pooled, keep-alive HTTP transport shared by the Github and Gitlab
+    clients.
+
+    One requests.Session is kept per scheme and host, so connections
+    (and their TLS handshakes) are reused across API calls.  Sessions
+    are created on first use and are safe to share between the sync
+    worker threads.
+    """
+
+    def __init__(self, pool_size=10, timeout=60, limiter=None):
+        """Create a new transport.
+
+        Arguments
+
+        pool_size: Maximum number of keep-alive connections per host.
+            This should be at least the number of sync workers.
+        timeout: Default (connect, read) timeout in seconds applied to
+            every request that does not pass its own.
+        limiter: An optional transport.RateLimiter that paces requests
+            and retries the ones that were rate limited.
+        """
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self.limiter = limiter
+        self.observers = []
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        """Return the pooled session used for the host of url."""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            s = self._sessions.get(key)
+            if s is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self._pool_size)
+                s.mount(f"{parts.scheme}://", adapter)
+                s.headers['Accept-Encoding'] = 'gzip, deflate'
+                self._sessions[key] = s
+        return s
+
+    def addObserver(self, observer):
+        """Register an observer of every HTTP request.  Its
+        onRequest(method, url, status, start, elapsed) is called after
+        each request, with the status code (None if the request raised),
+        the time.time() the request started and its duration in seconds.
+        """
+        self.observers.append(observer)
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session for url's host.
+        Takes the same keyword arguments as requests.request."""
+        kwargs.setdefault('timeout', self._timeout)
+        session = self.session(url)
+        if self.limiter is None:
+            return self._send(session, method, url, kwargs)
+        host = urllib.parse.urlsplit(url).netloc
+        for attempt in range(self.limiter.max_retries + 1):
+            self.limiter.wait(host)
+            r = self._send(session, method, url, kwargs)
+            delay = self.limiter.update(host, r)
+            if delay is None or attempt == self.limiter.max_retries:
+                break
+            time.sleep(delay)
+        return r
+
+    def _send(self, session, method, url, kwargs):
+        if not self.observers:
+            return session.request(method, url, **kwargs)
+        start = time.time()
+        status = None
+        try:
+            r = session.request(method, url, **kwargs)
+            status = r.status_code
+            return r
+        finally:
+            elapsed = time.time() - start
+            for observer in self.observers:
+                observer.onRequest(method, url, status, start, elapsed)
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def close(self):
+        """Close all pooled connections."""
+        with self._lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions = {}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def getTransport():
+    """Return the process-wide transport, creating it if needed."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+
+def setTransport(transport):
+    """Replace the process-wide transport used by clients that are not
+    given one explicitly."""
+    global _transport
+    with _transport_lock:
+        _transport = transport
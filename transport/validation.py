@@ -0,0 +1,44 @@
+import hashlib
+import threading
+import time
+
+from .jsonfile import loadJson, saveJson
+
+class ValidationCache:
+    """Remember for a while which API tokens were found valid, so runs
+    started shortly after each other skip the validation request.
+
+    Entries are keyed by a hash of the API URL and the token, the
+    tokens themselves are never written.
+    """
+
+    def __init__(self, path, ttl=3600):
+        """Open (creating if needed) the cache at path.  A validation is
+        trusted for ttl seconds."""
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = loadJson(path)
+
+    @staticmethod
+    def key(url, token):
+        return hashlib.sha256(f"{url}\0{token}".encode()).hexdigest()
+
+    def isValid(self, url, token):
+        """Check if token was found valid for url less than ttl seconds
+        ago."""
+        with self._lock:
+            checked = self._entries.get(self.key(url, token))
+        return checked is not None and time.time() - checked < self.ttl
+
+    def record(self, url, token):
+        """Record that token was just found valid for url."""
+        now = time.time()
+        with self._lock:
+            self._entries = {k: t for (k, t) in self._entries.items() if now - t < self.ttl}
+            self._entries[self.key(url, token)] = now
+            try:
+                saveJson(self.path, self._entries)
+            except OSError:
+                # Only costs a validation request next run
+                pass